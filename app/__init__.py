@@ -24,7 +24,7 @@ database = SQLAlchemy(app)
 login = LoginManager(app)
 login.init_app(app)
 
-from app.data_service.models import DataLoader, TableJoiner, ActiveUserHandler
+from app.data_service.models import DataLoader, TableJoiner, ActiveUserHandler, IngestionJobManager, PageCache
 
 from app.user_service.models import UserDataAccess, User
 from app.data_transform.models import DateTimeTransformer, DataTransformer, NumericalTransformations, OneHotEncode, DataDeduplicator
@@ -39,6 +39,8 @@ active_user_handler = ActiveUserHandler()
 table_joiner = TableJoiner(data_loader)
 one_hot_encoder = OneHotEncode(data_loader)
 data_deduplicator = DataDeduplicator(data_loader)
+job_manager = IngestionJobManager(data_loader)
+page_cache = PageCache()
 
 
 @login.user_loader
@@ -1,18 +1,32 @@
+import hashlib
+import json
 from functools import wraps
 
-from flask import abort, Blueprint, jsonify, request, send_from_directory, flash
+from flask import abort, Blueprint, current_app, jsonify, request, send_from_directory, flash, Response, \
+    stream_with_context
 from flask_login import current_user, login_user
 from passlib.hash import sha256_crypt
+from werkzeug.utils import secure_filename
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are only available with msgpack installed
+    msgpack = None
 
 from app import data_loader, date_time_transformer, data_transformer, numerical_transformer, one_hot_encoder, \
-    data_deduplicator, active_user_handler, UPLOAD_FOLDER
-from app.history.models import History
+    data_deduplicator, active_user_handler, job_manager, page_cache, UPLOAD_FOLDER, STREAM_BATCH_SIZE
+from app.data_service.controllers import allowed_file
+from app.history.models import History, table_versions
 from app.user_service.models import UserDataAccess
 
 api = Blueprint('api', __name__)
 
 _history = History()
 
+# Ways the rows of a table page can be sent: a dict per row, or the column names once followed by the rows (as
+# arrays of values) or by the columns (as arrays of values, for every block of STREAM_BATCH_SIZE rows)
+TABLE_LAYOUTS = ['objects', 'rows', 'columns']
+
 
 def auth_required(f):
     @wraps(f)
@@ -46,20 +60,271 @@ def get_table(dataset_id, table_name):
     order_direction = request.args.get('order[0][dir]')
     ordering = (order_column_name, order_direction)
     search = request.args.get('search[value]')
+    # Cursor of the previous or next page (from an earlier response), the offset is only used without one
+    cursor = request.args.get('cursor')
+    layout = request.args.get('layout', 'objects')
+    encoding = request.args.get('encoding', 'json')
+    if layout not in TABLE_LAYOUTS or encoding not in ['json', 'msgpack']:
+        return jsonify({'error': 'Unknown layout or encoding'}), 400
+    if encoding == 'msgpack' and msgpack is None:
+        return jsonify({'error': "Tables can't be sent as MessagePack without msgpack"}), 400
+
+    # Columns to send (a JSON list of names, all columns without it) and filters rows have to meet (a JSON list of
+    # {"column", "operator", "value"} objects, with one of the FILTER_OPERATORS)
+    fields = request.args.get('fields')
+    filters = request.args.get('filters')
+    try:
+        columns = json.loads(fields) if fields else None
+        if columns is not None and not isinstance(columns, list):
+            raise ValueError
+        filter_list = [(f['column'], f['operator'], f.get('value')) for f in json.loads(filters)] if filters else None
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return jsonify({'error': 'Invalid fields or filters'}), 400
+
+    # The draw counter of DataTables changes for every request, clients that want unchanged pages to be answered
+    # with a 304 leave it out (and match responses to their requests themselves), it's only sent back when given
+    draw = request.args.get('draw', type=int)
+    search_mode = request.args.get('search_mode') if search else None
+
+    # Pages are cached until their table changes, an unchanged page is sent again without any query
+    key = (dataset_id, table_name, table_versions.get(dataset_id, table_name), start, length, ordering, search,
+           search_mode, cursor, layout, encoding, fields, filters)
+    etag = hashlib.md5(repr(key + (draw,)).encode()).hexdigest()
+    cached = page_cache.get(key)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif cached is not None:
+        header, body = cached
+        response = Response([_table_header(_with_draw(header, draw), encoding), body])
+    else:
+        try:
+            if search_mode == 'full-text':
+                # Rows are ordered on relevance
+                table = data_loader.search_full_text(dataset_id, table_name, search, offset=start, limit=length,
+                                                     stream=True, columns=columns, filters=filter_list)
+            else:
+                table = data_loader.get_table(dataset_id, table_name, offset=start, limit=length, ordering=ordering,
+                                              search=search, cursor=cursor, stream=True, columns=columns,
+                                              filters=filter_list)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        header = {'recordsTotal': table.total_size, 'recordsFiltered': table.filtered_size}
+        if layout != 'objects':
+            header['columns'] = [column.name for column in table.columns]
+        body = _json_table(table, layout) if encoding == 'json' else _msgpack_table(table, layout)
+        response = Response(stream_with_context(_cached_page(key, draw, header, body, encoding)))
+    response.mimetype = 'application/json' if encoding == 'json' else 'application/x-msgpack'
+    response.set_etag(etag)
+    # The page may be stored, but has to be checked (with If-None-Match) before it's used again
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def _cached_page(key, draw, header, body, encoding):
+    """ Sends a table page and keeps it in the page cache, unless it turns out to be too large for it """
+    try:
+        yield _table_header(_with_draw(header, draw), encoding)
+        chunks, size = list(), 0
+        for chunk in body:
+            yield chunk
+            if chunks is not None:
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > page_cache.max_page:
+                    chunks = None
+        if chunks is not None:
+            page_cache.set(key, header, ''.join(chunks) if encoding == 'json' else b''.join(chunks))
+    finally:
+        body.close()
+
+
+def _with_draw(header, draw):
+    return dict(draw=draw, **header) if draw is not None else header
+
+
+def _table_header(header, encoding):
+    """ Returns the start of a table page, up to its data """
+    if encoding == 'msgpack':
+        return msgpack.packb(header, use_bin_type=True)
+    return json.dumps(header, separators=(',', ':'))[:-1] + ',"data":['
+
+
+def _table_blocks(table, layout):
+    """
+     Yields the rows of a (streamed) table in blocks of STREAM_BATCH_SIZE rows, in the given layout: a list of
+     dicts or of row arrays, or a list of column arrays.
+    """
+    column_names = [column.name for column in table.columns]
+    batch = list()
+    for row in table.rows:
+        batch.append(dict(zip(column_names, row)) if layout == 'objects' else row)
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield [list(column) for column in zip(*batch)] if layout == 'columns' else batch
+            batch = list()
+    if batch:
+        yield [list(column) for column in zip(*batch)] if layout == 'columns' else batch
+
+
+def _json_table(table, layout):
+    """
+     Writes the rows of a table page as JSON, a block at a time, so the page is never held in memory. Data holds the
+     rows (for the objects and rows layouts) or the column blocks (for the columns layout).
+    """
+    # Encodes values (dates, decimals, ...) the way jsonify does
+    encoder = current_app.json_encoder(separators=(',', ':'))
+    try:
+        separator = ''
+        for block in _table_blocks(table, layout):
+            yield separator + (encoder.encode(block) if layout == 'columns' else encoder.encode(block)[1:-1])
+            separator = ','
+        # The cursors are known once all rows are read
+        yield '],"next_cursor":{},"prev_cursor":{}}}'.format(encoder.encode(table.next_cursor),
+                                                           encoder.encode(table.prev_cursor))
+    finally:
+        table.rows.close()
+
+
+def _msgpack_table(table, layout):
+    """
+     Writes the rows of a table page as MessagePack objects, following the header (a map): an array per block of
+     rows and a map with the cursors of the pages around it.
+    """
+    # Values msgpack can't pack (dates, decimals, ...) are converted the way jsonify does
+    packer = msgpack.Packer(default=current_app.json_encoder().default, use_bin_type=True)
+    try:
+        for block in _table_blocks(table, layout):
+            yield packer.pack(block)
+        yield packer.pack({'next_cursor': table.next_cursor, 'prev_cursor': table.prev_cursor})
+    finally:
+        table.rows.close()
 
-    table = data_loader.get_table(dataset_id, table_name, offset=start, limit=length, ordering=ordering, search=search)
-    # Make proper data dict out of table rows
-    data = list()
-    for r_ix in range(len(table.rows)):
-        r = dict()
-        for c_ix in range(len(table.columns)):
-            r[table.columns[c_ix].name] = table.rows[r_ix][c_ix]
-        data.append(r)
 
-    return jsonify(draw=int(request.args.get('draw')),
-                   recordsTotal=table.total_size,
-                   recordsFiltered=table.total_size,
-                   data=data)  # table.rows
+@api.route('/api/jobs/<string:job_id>', methods=['GET'])
+@auth_required
+def get_job(job_id):
+    job = job_manager.get_job(job_id)
+    if job is None:
+        return abort(404)
+    if (data_loader.has_access(current_user.username, job.schema_id)) is False:
+        return abort(403)
+    return jsonify(job.to_dict())
+
+
+@api.route('/api/datasets/<int:dataset_id>/jobs', methods=['GET'])
+@auth_required
+def get_jobs(dataset_id):
+    if (data_loader.has_access(current_user.username, dataset_id)) is False:
+        return abort(403)
+    return jsonify(data=[job.to_dict() for job in job_manager.get_jobs(dataset_id)])
+
+
+@api.route('/api/datasets/<int:dataset_id>/uploads', methods=['POST'])
+@auth_required
+def create_upload(dataset_id):
+    """
+     Starts a resumable upload. Expects a JSON object with 'filename' and 'size' (in bytes), optionally 'chunk_size',
+     'table_name', 'table_desc' and 'type_deduction'. The chunks are then sent with
+     PUT /api/uploads/<id>/chunks/<index> (X-Checksum header: SHA-256 of the chunk, hex) and the upload is
+     finished with POST /api/uploads/<id>/complete. GET /api/uploads/<id> tells which chunk to send next.
+    """
+    if (data_loader.has_access(current_user.username, dataset_id)) is False:
+        return abort(403)
+    options = request.get_json(silent=True) or request.form
+    filename = secure_filename(options.get('filename') or '')
+    if not allowed_file(filename):
+        return jsonify({'error': "File type isn't supported"}), 400
+    try:
+        size = int(options.get('size'))
+        chunk_size = int(options.get('chunk_size') or 0) or None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid size'}), 400
+
+    table_name = (options.get('table_name') or '').replace('"', '')
+    if not table_name or table_name.isspace():
+        table_name = filename.rsplit('.')[0]
+    upload = job_manager.create_upload(dataset_id, filename, size, chunk_size=chunk_size, owner=current_user.username,
+                                       table_name=table_name,
+                                       table_description=options.get('table_desc') or 'Default description',
+                                       type_deduction=options.get('type_deduction') in [True, 'true', 'on'])
+    return jsonify(upload=upload.to_dict()), 201
+
+
+def _get_upload(upload_id):
+    upload = job_manager.get_upload(upload_id)
+    if upload is None:
+        return abort(404)
+    if upload.owner != current_user.username:
+        return abort(403)
+    return upload
+
+
+@api.route('/api/uploads/<string:upload_id>', methods=['GET'])
+@auth_required
+def get_upload(upload_id):
+    return jsonify(upload=_get_upload(upload_id).to_dict())
+
+
+@api.route('/api/uploads/<string:upload_id>/chunks/<int:index>', methods=['PUT'])
+@auth_required
+def upload_chunk(upload_id, index):
+    upload = _get_upload(upload_id)
+    try:
+        upload.add_chunk(index, request.get_data(cache=False), request.headers.get('X-Checksum'))
+    except ValueError as e:
+        # The client should continue from next_chunk
+        return jsonify({'error': str(e), 'upload': upload.to_dict()}), 409 if index != upload.next_chunk else 400
+    return jsonify(upload=upload.to_dict())
+
+
+@api.route('/api/uploads/<string:upload_id>/complete', methods=['POST'])
+@auth_required
+def complete_upload(upload_id):
+    upload = _get_upload(upload_id)
+    try:
+        job = job_manager.finish_upload(upload)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'upload': upload.to_dict()}), 400
+    return jsonify(upload=upload.to_dict(), job=job.to_dict()), 202
+
+
+@api.route('/api/uploads/<string:upload_id>', methods=['DELETE'])
+@auth_required
+def abort_upload(upload_id):
+    job_manager.abort_upload(_get_upload(upload_id))
+    return jsonify({'success': True})
+
+
+@api.route('/api/datasets/<int:dataset_id>/import-from-tables', methods=['POST'])
+@auth_required
+def import_from_tables(dataset_id):
+    """
+     Creates a table from tables in datasets the user has access to, without the data leaving the database.
+     Expects a JSON object with 'table_name', 'sources' (a list of {'dataset_id': ..., 'table_name': ...}) and
+     optionally 'table_desc', 'columns' and 'predicates' (as for removing rows by predicate).
+    """
+    options = request.get_json(silent=True) or {}
+    try:
+        sources = [(int(source['dataset_id']), source['table_name']) for source in options.get('sources') or []]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid sources'}), 400
+    for source_id in set([dataset_id] + [source[0] for source in sources]):
+        if (data_loader.has_access(current_user.username, source_id)) is False:
+            return abort(403)
+
+    table_name = (options.get('table_name') or '').replace('"', '')
+    if not table_name or table_name.isspace():
+        return jsonify({'error': 'No table name given'}), 400
+    try:
+        active_user_handler.make_user_active_in_dataset(dataset_id, current_user.username)
+        data_loader.import_from_tables(dataset_id, table_name, sources, columns=options.get('columns'),
+                                       predicates=options.get('predicates'),
+                                       desc=options.get('table_desc') or 'Default description')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception:
+        return jsonify({'error': True}), 400
+    return jsonify({'success': True, 'table_name': table_name}), 201
 
 
 @api.route('/api/datasets/<int:dataset_id>/tables/<string:table_name>/history', methods=['GET'])
@@ -76,11 +341,10 @@ def get_history(dataset_id, table_name):
     ordering = (['date', 'action_desc'][order_column], order_direction)
 
     rows = _history.get_actions(dataset_id, table_name, offset=start, limit=length, ordering=ordering, search=search)
-    _rows = _history.get_actions(dataset_id, table_name)
 
     return jsonify(draw=int(request.args.get('draw')),
-                   recordsTotal=len(_rows),
-                   recordsFiltered=len(_rows),
+                   recordsTotal=_history.count_actions(dataset_id, table_name),
+                   recordsFiltered=_history.count_actions(dataset_id, table_name, search=search),
                    data=rows)
 
 
@@ -267,10 +531,10 @@ def impute_missing_data(dataset_id, table_name):
 def export_table(dataset_id, table_name):
     if (data_loader.has_access(current_user.username, dataset_id)) is False:
         return abort(403)
-    # Maybe later we might add other types, but for now this is hardcoded to export as CSV
     try:
         active_user_handler.make_user_active_in_table(dataset_id, table_name, current_user.username)
-        filename = table_name + ".csv"
+        file_format = 'parquet' if request.args.get('format') == 'parquet' else 'csv'
+        filename = table_name + "." + file_format
         path = UPLOAD_FOLDER + "/" + filename
 
         separator = request.args.get('separator')
@@ -278,7 +542,7 @@ def export_table(dataset_id, table_name):
         empty_char = request.args.get('empty_char')
 
         data_loader.export_table(path, dataset_id, table_name, separator=separator, quote_char=quote_char,
-                                 empty_char=empty_char)
+                                 empty_char=empty_char, file_format=file_format)
         flash(u"Data has been exported.", 'success')
         return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=True)
     except Exception:
@@ -305,10 +569,9 @@ def show_raw_data(dataset_id, table_name):
     raw_table_name = "_raw_" + table_name
     ordering = (data_loader.get_column_names(dataset_id, raw_table_name)[order_column], order_direction)
     table = data_loader.get_table(dataset_id, raw_table_name, offset=start, limit=length, ordering=ordering)
-    _table = data_loader.get_table(dataset_id, raw_table_name)
     return jsonify(draw=int(request.args.get('draw')),
-                   recordsTotal=len(_table.rows),
-                   recordsFiltered=len(_table.rows),
+                   recordsTotal=table.total_size,
+                   recordsFiltered=table.filtered_size,
                    data=table.rows)
 
 
@@ -419,6 +682,21 @@ def rename_column(dataset_id, table_name):
         return jsonify({'error': True}), 400
 
 
+@api.route('/api/datasets/<int:dataset_id>/tables/<string:table_name>/statistics', methods=['GET'])
+@auth_required
+def statistics(dataset_id, table_name):
+    if (data_loader.has_access(current_user.username, dataset_id)) is False:
+        return abort(403)
+    try:
+        active_user_handler.make_user_active_in_table(dataset_id, table_name, current_user.username)
+        column_name = request.args.get('col-name')
+        numerical = request.args.get('col-type') in ['integer', 'double', 'real']
+        return jsonify(statistics=data_loader.get_statistics_for_column(dataset_id, table_name, column_name,
+                                                                        numerical))
+    except Exception:
+        return jsonify({'error': True}), 400
+
+
 @api.route('/api/datasets/<int:dataset_id>/tables/<string:table_name>/chart', methods=['GET'])
 @auth_required
 def chart(dataset_id, table_name):
@@ -537,6 +815,68 @@ def create_backup(dataset_id, table_name):
         return jsonify({'error': True}), 400
 
 
+@api.route('/api/datasets/<int:dataset_id>/tables/<string:table_name>/search-index', methods=['PUT'])
+@auth_required
+def create_search_index(dataset_id, table_name):
+    if (data_loader.has_access(current_user.username, dataset_id)) is False:
+        return abort(403)
+    try:
+        active_user_handler.make_user_active_in_table(dataset_id, table_name, current_user.username)
+        # Building the indexes of a large table takes a while, searching keeps working in the meantime
+        data_loader.create_search_index(dataset_id, table_name, background=True)
+        flash(u"Search index is being created.", 'success')
+        return jsonify({'success': True}), 202
+    except Exception:
+        flash(u"Search index couldn't be created.", 'danger')
+        return jsonify({'error': True}), 400
+
+
+@api.route('/api/datasets/<int:dataset_id>/tables/<string:table_name>/search-index', methods=['DELETE'])
+@auth_required
+def delete_search_index(dataset_id, table_name):
+    if (data_loader.has_access(current_user.username, dataset_id)) is False:
+        return abort(403)
+    try:
+        active_user_handler.make_user_active_in_table(dataset_id, table_name, current_user.username)
+        data_loader.delete_search_index(dataset_id, table_name)
+        flash(u"Search index has been removed.", 'success')
+        return jsonify({'success': True}), 200
+    except Exception:
+        flash(u"Search index couldn't be removed.", 'danger')
+        return jsonify({'error': True}), 400
+
+
+@api.route('/api/datasets/<int:dataset_id>/tables/<string:table_name>/full-text-index', methods=['PUT'])
+@auth_required
+def create_full_text_index(dataset_id, table_name):
+    if (data_loader.has_access(current_user.username, dataset_id)) is False:
+        return abort(403)
+    try:
+        active_user_handler.make_user_active_in_table(dataset_id, table_name, current_user.username)
+        data_loader.create_full_text_index(dataset_id, table_name, columns=request.args.getlist('columns'),
+                                           language=request.args.get('language', 'english'), background=True)
+        flash(u"Full-text index is being created.", 'success')
+        return jsonify({'success': True}), 202
+    except Exception:
+        flash(u"Full-text index couldn't be created.", 'danger')
+        return jsonify({'error': True}), 400
+
+
+@api.route('/api/datasets/<int:dataset_id>/tables/<string:table_name>/full-text-index', methods=['DELETE'])
+@auth_required
+def delete_full_text_index(dataset_id, table_name):
+    if (data_loader.has_access(current_user.username, dataset_id)) is False:
+        return abort(403)
+    try:
+        active_user_handler.make_user_active_in_table(dataset_id, table_name, current_user.username)
+        data_loader.delete_full_text_index(dataset_id, table_name)
+        flash(u"Full-text index has been removed.", 'success')
+        return jsonify({'success': True}), 200
+    except Exception:
+        flash(u"Full-text index couldn't be removed.", 'danger')
+        return jsonify({'error': True}), 400
+
+
 @api.route('/api/datasets/<int:dataset_id>/tables/<string:table_name>/restore-backup', methods=['GET'])
 @auth_required
 def restore_backup(dataset_id, table_name):
@@ -1,10 +1,12 @@
 import os
+import uuid
 
 from flask import Blueprint, request, render_template, redirect, url_for, abort, jsonify, flash
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 
-from app import app, data_loader, table_joiner, date_time_transformer,active_user_handler, data_deduplicator, ALLOWED_EXTENSIONS, UPLOAD_FOLDER
+from app import app, data_loader, table_joiner, date_time_transformer,active_user_handler, data_deduplicator, job_manager, \
+    ALLOWED_EXTENSIONS, COMPRESSED_EXTENSIONS, UPLOAD_FOLDER
 
 from app.data_service.models import TableJoinPair
 
@@ -12,6 +14,10 @@ data_service = Blueprint('data_service', __name__)
 
 
 def allowed_file(filename):
+    if '.' in filename and filename.rsplit('.', 1)[1].lower() in COMPRESSED_EXTENSIONS:
+        # Compressed files are decompressed while importing them, ZIP archives & Parquet files are compressed already
+        filename = filename.rsplit('.', 1)[0]
+        return '.' in filename and filename.rsplit('.', 1)[1].lower() in ['csv', 'jsonl', 'dump', 'sql']
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -55,8 +61,9 @@ def get_dataset(dataset_id):
     if len(tables) != 0:
         columns = data_loader.get_column_names(dataset_id, tables[0].name)
     active_user_handler.make_user_active_in_dataset(dataset_id, current_user.username)
+    jobs = [job.to_dict() for job in job_manager.get_jobs(dataset_id)]
     return render_template('data_service/dataset-view.html', ds=dataset, tables=tables, columns=columns,
-                           access_permission=access_permission, users_with_access=users_with_access)
+                           access_permission=access_permission, users_with_access=users_with_access, jobs=jobs)
 
 
 @data_service.route('/datasets/<int:dataset_id>/delete', methods=['POST'])
@@ -90,7 +97,8 @@ def add_table(dataset_id):
 
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        path = os.path.join(UPLOAD_FOLDER, filename)
+        # Every upload gets its own name, the file is only removed once its import job is done
+        path = os.path.join(UPLOAD_FOLDER, uuid.uuid4().hex + '-' + filename)
         try:
             file.save(path)
         except Exception as e:
@@ -100,6 +108,7 @@ def add_table(dataset_id):
             os.remove(path)
             flash(u"Failed to upload file.", 'danger')
             return get_dataset(dataset_id)
+        file.close()
 
         current_user.active_schema = dataset_id
 
@@ -110,25 +119,19 @@ def add_table(dataset_id):
             table_name = table_name.replace('"', '')
             if table_name.isspace():
                 table_name = filename.rsplit('.')[0]
-            if filename[-3:] == "zip":
-                data_loader.process_zip(path, dataset_id, type_deduction=type_deduction)
-            elif filename[-3:] == "csv":
-                create_new = not data_loader.table_exists(table_name, dataset_id)
-                if create_new:
-                    data_loader.process_csv(path, dataset_id, table_name, table_description=table_desc, type_deduction=type_deduction)
-                else:
-                    data_loader.process_csv(path, dataset_id, table_name, table_description=table_desc, append=True, type_deduction=type_deduction)
-            else:
-                data_loader.process_dump(path, dataset_id, table_name=table_name, table_description=table_desc)
-            flash(u"Data has been imported.", 'success')
+            job = job_manager.submit(path, dataset_id, table_name=table_name, table_description=table_desc,
+                                     type_deduction=type_deduction, owner=current_user.username, filename=filename)
         except Exception as e:
             app.logger.error("[ERROR] Failed to process file '" + filename + "'")
             app.logger.exception(e)
+            if os.path.exists(path):
+                os.remove(path)
             flash(u"Data couldn't be imported.", 'danger')
             return get_dataset(dataset_id)
 
-        file.close()
-        os.remove(path)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(job=job.to_dict()), 202
+        flash(u"Data is being imported.", 'info')
     return get_dataset(dataset_id)
 
 
@@ -137,10 +140,13 @@ def get_table(dataset_id, table_name):
     if (data_loader.has_access(current_user.username, dataset_id)) is False:
         return abort(403)
     try:
-        table = data_loader.get_table(dataset_id, table_name)
-        statistics = data_loader.get_statistics_for_all_columns(dataset_id, table_name, table.columns)
+        # Rows (and statistics) are loaded through the API once the page is shown
+        table = data_loader.get_table_outline(dataset_id, table_name)
         time_date_transformations = date_time_transformer.get_transformations()
         backups = data_loader.get_backups(dataset_id, table_name)
+        search_index = data_loader.has_search_index(dataset_id, table_name)
+        full_text_index = data_loader.get_full_text_index(dataset_id, table_name)
+        full_text_languages = data_loader.get_full_text_languages()
 
         raw_table_name = "_raw_" + table_name
         raw_table_exists = data_loader.table_exists(raw_table_name,dataset_id)
@@ -148,7 +154,9 @@ def get_table(dataset_id, table_name):
         active_user_handler.make_user_active_in_table(dataset_id, table_name, current_user.username)
         return render_template('data_service/table-view.html', table=table,
                                time_date_transformations=time_date_transformations,
-                               statistics=statistics, raw_table_exists=raw_table_exists, backups=backups)
+                               raw_table_exists=raw_table_exists, backups=backups,
+                               search_index=search_index, full_text_index=full_text_index,
+                               full_text_languages=full_text_languages)
     except Exception:
         flash(u"Table couldn't be shown.", 'danger')
         return redirect(url_for('data_service.get_dataset', dataset_id=dataset_id), code=303)
@@ -219,7 +227,7 @@ def show_raw_data(dataset_id, table_name):
         return redirect(url_for('data_service.get_table', dataset_id=dataset_id, table_name=table_name))
     try:
         active_user_handler.make_user_active_in_table(dataset_id, table_name, current_user.username)
-        table = data_loader.get_table(dataset_id, raw_table_name)
+        table = data_loader.get_table_outline(dataset_id, raw_table_name)
         title = "Raw data for " + table_name
         return render_template('data_service/raw-table-view.html', table=table, title=title)
     except Exception:
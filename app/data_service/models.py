@@ -1,13 +1,39 @@
+import base64
+import bz2
+import contextlib
 import csv
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
 import re
-import shutil
+import threading
+import time
+import uuid
+import weakref
 import pandas as pd
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
 from zipfile import ZipFile
 from psycopg2 import IntegrityError
-
-from app import app, database as db, ACTIVE_USER_TIME_SECONDS, BACKUP_LIMIT
-from app.history.models import History
+from sqlalchemy.exc import DataError
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet import & export are only available with pyarrow installed
+    pa = pq = None
+
+from app import app, database as db, ACTIVE_USER_TIME_SECONDS, BACKUP_LIMIT, CSV_CHUNK_SIZE, \
+    TYPE_INFERENCE_SAMPLE_SIZE, ZIP_WORKERS, INGESTION_WORKERS, JOB_RETENTION_SECONDS, COMPRESSED_EXTENSIONS, \
+    UPLOAD_FOLDER, UPLOAD_CHUNK_SIZE, UPLOAD_TIMEOUT_SECONDS, UPLOAD_CHECK_SECONDS, STREAMING_WORKERS, ROW_COUNT_ESTIMATE_THRESHOLD, STREAM_BATCH_SIZE, \
+    PAGE_CACHE_SIZE, PAGE_CACHE_MAX_PAGE, AUTO_INDEX_THRESHOLD, AUTO_INDEX_MIN_ROWS, AUTO_INDEX_BUDGET, \
+    AUTO_INDEX_TRACKED_COLUMNS, AUTO_INDEX_REFRESH_SECONDS, INDEX_CHECKS_KEPT
+from app.history.models import History, row_counts, table_columns, table_versions
 from app.data_transform.helpers import create_serial_sequence
 
 history = History()
@@ -25,6 +51,58 @@ def _cv(*args: str):
     return ["'{}'".format(str(arg).replace("'", "''")) for arg in args]
 
 
+# Types of the columns a search index covers. Their text (the ::text the search compares) can only be indexed if it's
+# immutable, which it isn't for dates and times: it depends on the DateStyle and TimeZone settings
+SEARCH_INDEX_TYPES = ['text', 'character varying', 'character', 'integer', 'bigint', 'smallint', 'numeric',
+                      'double precision', 'real', 'boolean']
+
+# Operators of the filters get_table takes, see DataLoader._filter_conditions
+FILTER_OPERATORS = ['=', '!=', '<', '<=', '>', '>=', 'in', 'between', 'null', 'not null']
+
+_decompressors = {'gz': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+
+def _split_compression(filename):
+    """ Splits 'table.csv.gz' into ('table.csv', 'gz'), the compression is None for an uncompressed file """
+    name, _, extension = filename.rpartition('.')
+    if name and extension.lower() in COMPRESSED_EXTENSIONS:
+        return name, extension.lower()
+    return filename, None
+
+
+def _open_file(path):
+    """ Opens a file for reading in binary mode, compressed files are decompressed on the fly """
+    compression = _split_compression(path)[1]
+    return _decompressors[compression](path, 'rb') if compression else open(path, 'rb')
+
+
+def _file_position(file):
+    """ Returns the position in a file object (0 for a filename), used to report the amount of bytes processed """
+    try:
+        return file.tell() if hasattr(file, 'tell') else 0
+    except (OSError, ValueError):
+        return 0
+
+
+def _make_cursor(ordering, row, backward=False):
+    """
+     Returns an opaque cursor for keyset pagination, pointing at a row (a row of SELECT *) in the given ordering.
+     A backward cursor asks for the page before that row instead of the one after it.
+    """
+    value = row[ordering[0]]
+    cursor = [ordering[0], ordering[1], None if value is None else str(value), row['id'], backward]
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def _read_cursor(cursor):
+    """ Returns (column, direction, value, id, backward) for a cursor made by _make_cursor """
+    try:
+        column, direction, value, row_id, backward = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return column, direction, value, int(row_id), bool(backward)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
 class Dataset:
     def __init__(self, id, name, desc, owner, moderators=None, active_users_count=0):
         self.name = name
@@ -53,6 +131,9 @@ class Table:
         self.active_users_count = active_users_count
         self.total_size = total_size
         self.dataset = None
+        self.next_cursor = None
+        self.prev_cursor = None
+        self.filtered_size = total_size  # amount of rows matching the search
 
     def __eq__(self, other):
         return self.name == other.name and self.desc == other.desc
@@ -173,9 +254,373 @@ class ActiveUserHandler:
             raise e
 
 
+class TypeInferrer:
+    """
+     Decides the type of every column of an uploaded file on a sample of its rows and validates/converts
+     the (string) values of every chunk against those types. Values of a column that don't fit its type
+     make the column fall back to a wider type (integer -> double -> text, date -> timestamp -> text).
+    """
+
+    SQL_TYPES = {'integer': 'bigint', 'double': 'double precision', 'boolean': 'boolean', 'date': 'date',
+                 'timestamp': 'timestamp', 'text': 'text'}
+    FALLBACK_TYPES = {'integer': 'double', 'double': 'text', 'boolean': 'text', 'date': 'timestamp',
+                      'timestamp': 'text'}
+    BOOLEAN_VALUES = ['true', 'false', 't', 'f', 'yes', 'no']
+
+    def __init__(self, sample_size=TYPE_INFERENCE_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.types = dict()
+
+    def infer(self, df):
+        """ Decides the type of every column of the DataFrame (of strings) on its first sample_size rows """
+        for column in df.columns:
+            sample = df[column].head(self.sample_size).dropna()
+            self.types[column] = 'text'
+            for column_type in ['boolean', 'integer', 'double', 'date']:
+                if len(sample) and self.convert_column(sample, column_type) is not None:
+                    self.types[column] = column_type
+                    break
+        return self.types
+
+    def use_table_types(self, columns):
+        """ Takes the types of an existing table (a list of 'Column' objects) instead of inferring them """
+        for column in columns:
+            self.types[column.name] = column.type if column.type in self.SQL_TYPES else 'text'
+        return self.types
+
+    def sql_types(self, columns):
+        return [self.SQL_TYPES[self.types[column]] for column in columns]
+
+    def convert(self, df):
+        """
+         Converts the columns of a DataFrame (of strings) in place.
+         Returns the columns whose type had to fall back because a value didn't fit.
+        """
+        changed = list()
+        for column in df.columns:
+            values = df[column].dropna()
+            converted = self.convert_column(values, self.types.setdefault(column, 'text'))
+            if converted is None:
+                changed.append(column)
+                while converted is None:
+                    self.types[column] = self.FALLBACK_TYPES[self.types[column]]
+                    converted = self.convert_column(values, self.types[column])
+            if converted is not values:
+                df[column] = converted
+        return changed
+
+    def convert_column(self, values, column_type):
+        """
+         Returns the non-null values converted to the given type, or None if some value doesn't fit it.
+         Numbers and booleans are only validated, since Postgres parses those itself.
+        """
+        if column_type == 'boolean':
+            return values if values.str.strip().str.lower().isin(self.BOOLEAN_VALUES).all() else None
+        elif column_type == 'integer':
+            # Values that don't fit in a bigint are parsed as uint64/float64
+            numbers = pd.to_numeric(values, errors='coerce')
+            return values if numbers.dtype == 'int64' else None
+        elif column_type == 'double':
+            return values if pd.to_numeric(values, errors='coerce').notnull().all() else None
+        elif column_type in ['date', 'timestamp']:
+            if not values.str.contains(r'\d').all():
+                return None
+            parsed = pd.to_datetime(values, errors='coerce', infer_datetime_format=True)
+            if parsed.isnull().any():
+                return None
+            if column_type == 'date' and ((parsed != parsed.dt.normalize()).any() or values.str.contains(':').any()):
+                return None
+            return parsed
+        return values
+
+
+class SQLDumpReader:
+    """
+     Streams the rows of the INSERT statements of a SQL dump, reading the file a block at a time.
+     String literals, quoted identifiers and comments are tokenized as a whole, so commas, parentheses and
+     semicolons inside of them don't break the parsing. Other statements (and the data of COPY ... FROM stdin)
+     are skipped.
+     Tuples of plain literals (strings, numbers, NULL, ...) are matched with a single regex at a time,
+     anything else falls back to the tokenizer.
+    """
+
+    TOKEN = re.compile(r"""
+          (?P<space>\s+|--[^\n]*(?:\n|\Z)|/\*.*?(?:\*/|\Z))
+        | (?P<string>[Ee]'(?:[^'\\]|\\.|'')*'(?!')|'(?:[^']|'')*'(?!')|[Ee]?'.*\Z)
+        | (?P<identifier>"(?:[^"]|"")*"(?!")|".*\Z)
+        | (?P<dollar>\$(?P<tag>[A-Za-z_]\w*|)\$.*?(?:\$(?P=tag)\$|\Z))
+        | (?P<word>-?\d+(?:\.\d*)?(?:[Ee][-+]?\d+)?|[^\s'"$;(),.\[\]]+)
+        | (?P<symbol>[;(),.\[\]])
+    """, re.S | re.X)
+    IDENTIFIER = re.compile(r'"(?:[^"]|"")*"|[^\s\'"$;(),.]+')
+    LITERAL = re.compile(r"""[Ee]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|-?\d+(?:\.\d*)?(?:[Ee][-+]?\d+)?|(?i:NULL|TRUE|FALSE)""")
+    INSERT_HEADER = re.compile(r"""\s+(?i:INTO)\s+(?P<table>(?:{0})(?:\s*\.\s*(?:{0}))?)
+                                   \s*(?P<columns>\(\s*(?:{0})(?:\s*,\s*(?:{0}))*\s*\))?\s*(?i:VALUES)\b
+                                """.format(IDENTIFIER.pattern), re.X)
+    TUPLE = re.compile(r"""\s*\(\s*(?P<values>(?:{0})(?:\s*,\s*(?:{0}))*)\s*\)\s*(?P<end>[,;])
+                        """.format(LITERAL.pattern), re.X)
+    ESCAPE = re.compile(r"\\(.)|''", re.S)
+    ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+    COPY_END = re.compile(r'^\\\.\r?$', re.M)
+
+    def __init__(self, file, block_size=1 << 20):
+        self.file = file
+        self.block_size = block_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._headers = dict()
+
+    def _read_block(self):
+        """ Drops the consumed part of the buffer and appends the next block of the file to it """
+        block = self.file.read(self.block_size)
+        self._buffer = self._buffer[self._pos:] + block
+        self._pos = 0
+        self._eof = not block
+
+    def _match(self, pattern):
+        """
+         Matches the pattern at the current position and moves past it, or returns None.
+         At most one more block is read, a match that might continue in the next block counts as no match.
+        """
+        match = pattern.match(self._buffer, self._pos)
+        if not self._eof and (match is None or match.end() >= len(self._buffer) - 1) \
+                and len(self._buffer) - self._pos < self.block_size:
+            self._read_block()
+            match = pattern.match(self._buffer, self._pos)
+        if match is None or (not self._eof and match.end() >= len(self._buffer) - 1):
+            return None
+        self._pos = match.end()
+        return match
+
+    def tokens(self):
+        """ Yields (kind, value) tuples, with quotes and escapes removed from strings and identifiers """
+        while True:
+            match = self.TOKEN.match(self._buffer, self._pos)
+            # A token that ends at the end of the buffer might continue in the next block
+            if not self._eof and (match is None or match.end() >= len(self._buffer) - 1):
+                self._read_block()
+                continue
+            if match is None:
+                if self._pos < len(self._buffer):
+                    raise ValueError("Unexpected character in SQL dump: '" + self._buffer[self._pos] + "'")
+                return
+
+            self._pos = match.end()
+            kind, text = match.lastgroup, match.group()
+            if kind == 'space':
+                continue
+            elif kind == 'string':
+                text = self._string(text)
+            elif kind == 'identifier':
+                text = self._identifier(text)
+            elif kind == 'dollar':
+                tag_length = len(match.group('tag')) + 2
+                kind, text = 'string', text[tag_length:-tag_length]
+            yield kind, text
+
+    def _string(self, text):
+        if text[0] in 'Ee':
+            return self.ESCAPE.sub(lambda m: self.ESCAPES.get(m.group(1), m.group(1)) if m.group(1) else "'",
+                                   text[2:-1])
+        return text[1:-1].replace("''", "'")
+
+    @staticmethod
+    def _identifier(text):
+        return text[1:-1].replace('""', '"') if text[0] == '"' else text
+
+    def skip_copy_data(self):
+        """ Skips the data lines following a COPY ... FROM stdin statement, up to the closing '\\.' line """
+        while True:
+            match = self.COPY_END.search(self._buffer, self._pos)
+            if match is not None:
+                self._pos = match.end()
+                return
+            if self._eof:
+                self._pos = len(self._buffer)
+                return
+            # Keep the last (possibly incomplete) line, the end marker might be split over two blocks
+            self._pos = max(self._pos, self._buffer.rfind('\n'))
+            self._read_block()
+
+    def rows(self):
+        """
+         Yields a (table, columns, values) tuple for every row of every INSERT statement.
+         columns is None if the statement doesn't name its columns, NULL values are None.
+        """
+        tokens = self.tokens()
+        for kind, value in tokens:
+            keyword = value.upper() if kind == 'word' else None
+            if keyword == 'INSERT':
+                yield from self._insert_rows(tokens)
+            elif keyword == 'COPY':
+                words = [keyword] + [value.upper() for kind, value in self._statement(tokens) if kind == 'word']
+                if words[-2:] == ['FROM', 'STDIN']:
+                    self.skip_copy_data()
+            elif value != ';':
+                self._skip(self._statement(tokens))
+
+    def _statement(self, tokens):
+        """ Yields the remaining tokens of the current statement, up to (and consuming) the closing ';' """
+        for kind, value in tokens:
+            if kind == 'symbol' and value == ';':
+                return
+            yield kind, value
+
+    def _insert_rows(self, tokens):
+        # INSERT INTO [schema.]table [(column, ...)] VALUES (value, ...)[, (value, ...), ...] ;
+        statement = self._statement(tokens)
+        header = self._match(self.INSERT_HEADER)
+        if header is not None:
+            if header.group() not in self._headers:
+                table = self.IDENTIFIER.findall(header.group('table'))[-1]
+                columns = self.IDENTIFIER.findall(header.group('columns') or '')
+                self._headers[header.group()] = (self._identifier(table),
+                                                 [self._identifier(column) for column in columns] or None)
+            table, columns = self._headers[header.group()]
+        else:
+            table, columns = self._insert_header(statement)
+            if table is None:
+                return
+
+        while True:
+            row = self._match(self.TUPLE)
+            if row is not None:
+                yield table, columns, [self._literal(value) for value in self.LITERAL.findall(row.group('values'))]
+                if row.group('end') == ';':
+                    return
+                continue
+
+            kind, value = next(statement, (None, None))
+            if (kind, value) == ('symbol', '('):
+                yield table, columns, self._values(statement)
+            elif kind is None:
+                return
+            elif (kind, value) != ('symbol', ','):
+                # ON CONFLICT, RETURNING, ...
+                self._skip(statement)
+                return
+
+    def _insert_header(self, statement):
+        """ Reads the table name and columns of an INSERT statement with the tokenizer, up to VALUES """
+        kind, table = next(statement, (None, None))
+        if kind == 'word' and table.upper() == 'INTO':
+            kind, table = next(statement, (None, None))
+        kind, value = next(statement, (None, None))
+        while (kind, value) == ('symbol', '.'):
+            # Schema qualified table name, only the table name is used
+            kind, table = next(statement, (None, None))
+            kind, value = next(statement, (None, None))
+
+        columns = None
+        if (kind, value) == ('symbol', '('):
+            columns = list(self._column_names(statement))
+            kind, value = next(statement, (None, None))
+        if kind != 'word' or value.upper() != 'VALUES':
+            # INSERT ... SELECT, DEFAULT VALUES, ...
+            self._skip(statement)
+            return None, None
+        return table, columns
+
+    def _column_names(self, tokens):
+        """ Yields the names of a column list, up to (and consuming) its closing parenthesis """
+        for kind, value in tokens:
+            if (kind, value) == ('symbol', ')'):
+                return
+            if (kind, value) != ('symbol', ','):
+                yield value
+
+    def _values(self, tokens):
+        """ Reads the values of a tuple, up to (and consuming) its closing parenthesis """
+        values = list()
+        value_tokens = list()
+        depth = 0
+        for kind, value in tokens:
+            if kind == 'symbol' and depth == 0 and value in [',', ')']:
+                values.append(self._value(value_tokens))
+                value_tokens = list()
+                if value == ')':
+                    break
+                continue
+            if kind == 'symbol':
+                # Commas in nested parentheses and brackets (ROW(...), ARRAY[...]) don't end the value
+                depth += {'(': 1, '[': 1, ')': -1, ']': -1}.get(value, 0)
+            value_tokens.append((kind, value))
+        return values
+
+    def _value(self, tokens):
+        for i, (kind, value) in enumerate(tokens):
+            if kind == 'word' and value.startswith('::'):
+                # Drop type casts, e.g. '2018-01-01'::date
+                tokens = tokens[:i]
+                break
+        if len(tokens) == 1:
+            kind, value = tokens[0]
+            return None if kind == 'word' and value.upper() == 'NULL' else value
+        return ''.join(value for kind, value in tokens) or None
+
+    def _literal(self, text):
+        if text[0] == "'" or text[0] in 'Ee' and text[1:2] == "'":
+            return self._string(text)
+        return None if text.upper() == 'NULL' else text
+
+    @staticmethod
+    def _skip(tokens):
+        for _ in tokens:
+            pass
+
+
+class PageCache:
+    """
+     Least recently used cache of encoded table pages (as sent by the table API). Pages are keyed on the version of
+     their table (see TableVersions) and everything else they depend on, so they never have to be invalidated: pages
+     of older versions just aren't asked for anymore. At most size bytes are kept, larger pages than max_page bytes
+     aren't kept at all.
+    """
+
+    def __init__(self, size=PAGE_CACHE_SIZE, max_page=PAGE_CACHE_MAX_PAGE):
+        self.size = size
+        self.max_page = max_page
+        self.used = 0
+        self.pages = OrderedDict()  # key -> (header, body)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            page = self.pages.get(key)
+            if page is not None:
+                self.pages.move_to_end(key)
+            return page
+
+    def set(self, key, header, body):
+        if len(body) > self.max_page:
+            return
+        with self.lock:
+            if key in self.pages:
+                self.used -= len(self.pages.pop(key)[1])
+            self.pages[key] = (header, body)
+            self.used += len(body)
+            while self.used > self.size:
+                self.used -= len(self.pages.popitem(last=False)[1][1])
+
+
 class DataLoader:
     def __init__(self):
-        pass
+        self.lock = threading.Lock()
+        # Indexes being built (or updated), so they aren't built twice at once: (schema_name, table_name) for the
+        # search index of a table, (schema_name, index name) for sort and full-text indexes
+        self.index_builds = set()
+        # (schema_name, table_name, column) -> amount of pages sorted on a column without index, for at most
+        # AUTO_INDEX_TRACKED_COLUMNS columns (the ones sorted on least recently are forgotten)
+        self.sort_uses = OrderedDict()
+        # (schema_name, table_name, column) -> time (time.monotonic) the use of its sort index was last recorded, for at
+        # most AUTO_INDEX_TRACKED_COLUMNS columns
+        self.sort_index_uses = OrderedDict()
+        # (kind, schema_name, table_name) -> version of the table when its index of that kind was last checked, for at
+        # most INDEX_CHECKS_KEPT tables
+        self.index_checks = OrderedDict()
+        # (schema_id, table_name) -> lock held while loading rows into a table, so loads don't both create it
+        self.load_locks = weakref.WeakValueDictionary()
 
     # Dataset & Data handling (inserting/deleting...)
     def create_dataset(self, name, owner_id, desc="Default description", ):
@@ -241,6 +686,9 @@ class DataLoader:
             db.engine.execute('DELETE FROM Dataset WHERE id = {};'.format(_cv(schema_name)))
 
             db.engine.execute('DROP SCHEMA IF EXISTS {} CASCADE;'.format(_ci(schema_name)))
+            row_counts.invalidate_dataset(schema_id)
+            table_versions.bump_dataset(schema_id)
+            table_columns.invalidate_dataset(schema_id)
 
             # check if there are datasets. If not, clean available_schema
             rows = db.engine.execute('SELECT COUNT(*) FROM Dataset;')
@@ -286,9 +734,12 @@ class DataLoader:
             app.logger.exception(e)
             raise e
 
-    def create_table(self, name, schema_id, columns, desc="Default description", raw=False, metadata_only=False):
+    def create_table(self, name, schema_id, columns, desc="Default description", raw=False, metadata_only=False,
+                     column_types=None):
         """
          This method takes a schema, name and a list of columns and creates the corresponding table
+         If column_types is given, it should hold a Postgres type for every column (in the same order),
+         otherwise every column will be created as varchar(255)
         """
 
         connection = db.engine.connect()
@@ -301,8 +752,9 @@ class DataLoader:
 
                 query += 'id serial primary key'  # Since we don't know what the actual primary key should be, just assign an id
 
-                for column in columns:
-                    query = query + ', \n\"' + column.replace('"', '') + '\" varchar(255)'
+                for c_ix in range(len(columns)):
+                    column_type = column_types[c_ix] if column_types else 'varchar(255)'
+                    query = query + ', \n\"' + columns[c_ix].replace('"', '') + '\" ' + column_type
                 query += '\n);'
 
                 raw_table_query = query.format(*_ci(schema_name, raw_table_name))
@@ -336,6 +788,8 @@ class DataLoader:
                                    *_cv(schema_name, name)))
 
             transaction.commit()
+            # A table dropped by undoing an earlier action might have had the same name
+            table_columns.invalidate(schema_id, raw_table_name)
 
         except Exception as e:
             transaction.rollback()
@@ -360,6 +814,12 @@ class DataLoader:
 
             # Delete history
             history_query = 'DELETE FROM HISTORY WHERE id_dataset={} AND id_table={};'.format(*_cv(schema_name, name))
+            connection.execute('DELETE FROM Search_Index WHERE id_dataset={} AND id_table={};'.format(
+                *_cv(schema_name, name)))
+            connection.execute('DELETE FROM Full_Text_Index WHERE id_dataset={} AND id_table={};'.format(
+                *_cv(schema_name, name)))
+            connection.execute('DELETE FROM Auto_Index WHERE id_dataset={} AND id_table={};'.format(
+                *_cv(schema_name, name)))
 
             # Delete backups
             backups = self.get_backups(schema_id, name)
@@ -373,6 +833,12 @@ class DataLoader:
             connection.execute(dedup_table_query)
 
             transaction.commit()
+            row_counts.invalidate(schema_id, name)
+            table_versions.bump(schema_id, name)
+            table_columns.invalidate(schema_id, name)
+            row_counts.invalidate(schema_id, "_raw_" + name)
+            table_versions.bump(schema_id, "_raw_" + name)
+            table_columns.invalidate(schema_id, "_raw_" + name)
         except Exception as e:
             transaction.rollback()
             app.logger.error("[ERROR] Failed to delete table '" + name + "'")
@@ -385,11 +851,107 @@ class DataLoader:
         try:
             db.engine.execute(
                 'CREATE TABLE {0}.{1} AS SELECT * FROM {0}.{2};'.format(_ci(schema_name), _ci(copy_name), _ci(name)))
+            table_columns.invalidate(schema_id, copy_name)
         except Exception as e:
             app.logger.error("[ERROR] Unable to create copy of table {}".format(name))
             app.logger.exception(e)
             raise e
 
+    def import_from_tables(self, schema_id, name, sources, columns=None, predicates=None,
+                           desc="Default description"):
+        """
+         Creates table 'name' in the given schema from the rows of one or more tables in other (or the same) datasets,
+         with a CREATE TABLE ... AS SELECT, so the data never leaves the database. Sources is a list of
+         (schema_id, table_name) pairs, their rows are appended in that order. Columns is a list of columns that all
+         sources should have (by default, all columns of the first source) and keep their type. Predicates are of the
+         form used by delete_row_predicate and filter the rows of every source.
+         Like create_table, a raw copy, metadata and a history entry are created as well.
+        """
+        schema_name = 'schema-' + str(schema_id)
+        raw_table_name = '_raw_' + name
+        if not sources:
+            raise ValueError("No tables to import from")
+        if self.table_exists(name, schema_id):
+            raise ValueError("Table '{}' already exists".format(name))
+
+        if not columns:
+            columns = self.get_column_names(*sources[0])
+        columns = [column for column in columns if column != 'id']
+        where = self._where_clause(predicates)
+
+        selects = list()
+        for source_schema_id, source_table in sources:
+            missing = set(columns + [p[1] for p in predicates or []]) - set(
+                self.get_column_names(source_schema_id, source_table))
+            if missing:
+                raise ValueError("Table '{}' has no column(s) {}".format(source_table, ', '.join(sorted(missing))))
+            selects.append('SELECT {} FROM {}.{} {}'.format(', '.join(_ci(column) for column in columns),
+                                                            *_ci('schema-' + str(source_schema_id), source_table),
+                                                            where))
+
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        try:
+            connection.execute('CREATE TABLE {}.{} AS SELECT (row_number() OVER ())::integer AS id, * FROM ({}) AS '
+                               'source;'.format(*_ci(schema_name, name), ' UNION ALL '.join(selects)))
+            connection.execute('CREATE TABLE {0}.{1} AS TABLE {0}.{2};'.format(*_ci(schema_name, raw_table_name, name)))
+            for table in [name, raw_table_name]:
+                self._add_serial_id(connection, schema_name, table)
+
+            connection.execute('INSERT INTO metadata VALUES({}, {}, {});'.format(*_cv(schema_name, name, desc)))
+
+            history.log_action(schema_id, name, datetime.now(), 'Created table',
+                               'DROP TABLE IF EXISTS {}.{};'.format(*_ci(schema_name, name)) +
+                               'DROP TABLE IF EXISTS {}.{};'.format(*_ci(schema_name, raw_table_name)) +
+                               'DELETE FROM METADATA WHERE ID_DATASET={} AND ID_TABLE={};'.format(
+                                   *_cv(schema_name, name)) +
+                               'DELETE FROM HISTORY WHERE ID_DATASET={} AND ID_TABLE={};'.format(
+                                   *_cv(schema_name, name)))
+            transaction.commit()
+            table_columns.invalidate(schema_id, raw_table_name)
+        except Exception as e:
+            transaction.rollback()
+            app.logger.error("[ERROR] Unable to import table '" + name + "' from other tables")
+            app.logger.exception(e)
+            raise e
+
+    @staticmethod
+    def _where_clause(predicates):
+        """
+         Builds a WHERE clause out of predicates of the form [[AND | OR] [COLUMN] [CONDITION] [VALUE]], conditions
+         other than comparisons, LIKE and CONTAINS are refused.
+        """
+        if not predicates:
+            return ''
+        conditions = list()
+        for p_ix, (connective, column, condition, value) in enumerate(predicates):
+            condition = condition.upper()
+            if condition not in ['=', '!=', '<>', '<', '<=', '>', '>=', 'LIKE', 'CONTAINS'] or \
+                    (p_ix and connective.upper() not in ['AND', 'OR']):
+                raise ValueError("Invalid predicate {}".format(predicates[p_ix]))
+            value = str(value)
+            if condition == 'CONTAINS':
+                condition, value = 'LIKE', '%' + re.sub(r'([\\%_])', r'\\\1', value) + '%'
+            value = value.replace('%', '%%')
+            conditions.append('{} {} {} {}'.format(connective.upper() if p_ix else '', _ci(column), condition,
+                                                   _cv(value)))
+        return 'WHERE (' + ' '.join(conditions) + ')'
+
+    @staticmethod
+    def _add_serial_id(connection, schema_name, table_name):
+        """ Turns the id column of a table created with CREATE TABLE ... AS into a serial primary key """
+        # Sequences keep their name when their table is renamed, a name that's taken gets a number (as with serial)
+        sequence, number = '{}.{}'.format(*_ci(schema_name, table_name + '_id_seq')), 0
+        while connection.execute('SELECT to_regclass({}) IS NOT NULL;'.format(_cv(sequence))).first()[0]:
+            number += 1
+            sequence = '{}.{}'.format(*_ci(schema_name, table_name + '_id_seq' + str(number)))
+        connection.execute('ALTER TABLE {}.{} ADD PRIMARY KEY (id);'.format(*_ci(schema_name, table_name)))
+        connection.execute('CREATE SEQUENCE {} OWNED BY {}.{}.id;'.format(sequence, *_ci(schema_name, table_name)))
+        connection.execute("SELECT setval({0}, COALESCE((SELECT MAX(id) FROM {1}.{2}), 0) + 1, false);".format(
+            _cv(sequence), *_ci(schema_name, table_name)))
+        connection.execute("ALTER TABLE {}.{} ALTER id SET DEFAULT nextval({}::regclass);".format(
+            *_ci(schema_name, table_name), _cv(sequence)))
+
     def delete_row(self, schema_id, table_name, row_ids, add_history=True):
         schema_name = 'schema-' + str(schema_id)
         try:
@@ -400,7 +962,8 @@ class DataLoader:
                     'SELECT * FROM {}.{} WHERE id={};'.format(*_ci(schema_name, table_name),
                                                               _cv(row_id))).fetchone()[1:]
 
-                db.engine.execute('DELETE FROM {}.{} WHERE id={};'.format(*_ci(schema_name, table_name), _cv(row_id)))
+                deleted = db.engine.execute(
+                    'DELETE FROM {}.{} WHERE id={};'.format(*_ci(schema_name, table_name), _cv(row_id))).rowcount
                 # Log action to history
                 values_query = 'DEFAULT'
 
@@ -418,7 +981,10 @@ class DataLoader:
                                                                                     column_tuple),
                                                                                 values_query)
                     history.log_action(schema_id, table_name, datetime.now(), 'Deleted row #' + str(row_id),
-                                       inverse_query)
+                                       inverse_query, row_delta=-deleted)
+                else:
+                    row_counts.add(schema_id, table_name, -deleted)
+                    table_versions.bump(schema_id, table_name)
         except Exception as e:
             app.logger.error("[ERROR] Unable to delete row from table '" + table_name + "'")
             app.logger.exception(e)
@@ -480,9 +1046,7 @@ class DataLoader:
     def delete_column(self, schema_id, table_name, column_name):
         schema_name = 'schema-' + str(schema_id)
 
-        column_type = db.engine.execute(
-            "select data_type from information_schema.columns where table_name = '{}' and column_name='{}';".format(
-                table_name, column_name)).fetchone()[0]
+        column_type = dict(self._table_columns(schema_id, table_name))[column_name]
 
         # create inverse query
         inverse_query = 'ALTER TABLE {}.{} ADD COLUMN {} {} NULL;'.format(*_ci(schema_name, table_name, column_name),
@@ -497,10 +1061,16 @@ class DataLoader:
         try:
             db.engine.execute(
                 'ALTER TABLE {}.{} DROP COLUMN IF EXISTS {};'.format(*_ci(schema_name, table_name, column_name)))
+            # Its sort index was dropped along with it
+            db.engine.execute('DELETE FROM Auto_Index WHERE id_dataset={} AND id_table={} AND column_name={};'.format(
+                *_cv(schema_name, table_name, column_name)))
         except Exception as e:
             app.logger.error("[ERROR] Unable to delete column from table '" + table_name + "'")
             app.logger.exception(e)
             raise e
+        finally:
+            table_columns.invalidate(schema_id, table_name)
+            table_versions.bump(schema_id, table_name)
 
         # Log action to history
         history.log_action(schema_id, table_name, datetime.now(), 'Deleted column ' + column_name, inverse_query)
@@ -534,7 +1104,10 @@ class DataLoader:
             row_id = db.engine.execute('SELECT MAX(id) FROM {}.{};'.format(*_ci(schemaname, table))).fetchone()[0]
             inverse_query = 'DELETE FROM {}.{} WHERE id={};'.format(*_ci(schemaname, table), _cv(row_id))
             history.log_action(schema_id, table, datetime.now(), 'Added row with values ' + ' '.join(values),
-                               inverse_query)
+                               inverse_query, row_delta=1)
+        else:
+            row_counts.add(schema_id, table, 1)
+            table_versions.bump(schema_id, table)
 
     def insert_column(self, schema_id, table_name, column_name, column_type, enable_history=True):
         schema_name = 'schema-' + str(schema_id)
@@ -547,6 +1120,9 @@ class DataLoader:
             app.logger.error("[ERROR] Unable to insert column into table '{}'".format(table_name))
             app.logger.exception(e)
             raise e
+        finally:
+            table_columns.invalidate(schema_id, table_name)
+            table_versions.bump(schema_id, table_name)
 
         # Log action to history
         if enable_history:
@@ -563,25 +1139,47 @@ class DataLoader:
             db.engine.execute(
                 'ALTER TABLE {0}.{1} RENAME {2} TO {3};'.format(
                     *_ci(schema_name, table_name, column_name, new_column_name)))
+            for query in self._rename_column_indexes(schema_name, table_name, column_name, new_column_name):
+                db.engine.execute(query)
         except Exception as e:
             app.logger.error(
                 "[ERROR] Unable to rename column '{0}' to '{1}' in table '{2}'".format(column_name, new_column_name,
                                                                                        table_name))
             app.logger.exception(e)
             raise e
+        finally:
+            table_columns.invalidate(schema_id, table_name)
+            table_versions.bump(schema_id, table_name)
 
         # Log action to history
         inverse_query = 'ALTER TABLE {}.{} RENAME {} TO {};'.format(*_ci(schema_name, table_name, new_column_name,
                                                                          column_name))
+        inverse_query += ''.join(self._rename_column_indexes(schema_name, table_name, new_column_name, column_name))
         history.log_action(schema_id, table_name, datetime.now(),
                            'Renamed column {} to {}'.format(column_name, new_column_name), inverse_query)
 
+    @staticmethod
+    def _rename_column_indexes(schema_name, table_name, column_name, new_column_name):
+        """
+         Returns the queries making the indexes of a table follow a renamed column. Undoing the rename runs them
+         (the other way around) as well.
+        """
+        # The full-text index follows the column, its columns have to be renamed as well
+        return ['UPDATE Full_Text_Index SET columns=(SELECT json_agg(CASE WHEN name={0} THEN {1} ELSE name END ORDER BY '
+                'position)::text FROM json_array_elements_text(columns::json) WITH ORDINALITY AS c(name, position)) '
+                'WHERE id_dataset={2} AND id_table={3} AND columns::jsonb ? {0};'.format(
+                    *_cv(column_name, new_column_name, schema_name, table_name)),
+                # The sort index is named after the column
+                'UPDATE Auto_Index SET column_name={} WHERE id_dataset={} AND id_table={} AND column_name={};'.format(
+                    *_cv(new_column_name, schema_name, table_name, column_name)),
+                'ALTER INDEX IF EXISTS {}.{} RENAME TO {};'.format(
+                    *_ci(schema_name, DataLoader._sort_index_name(table_name, column_name),
+                         DataLoader._sort_index_name(table_name, new_column_name)))]
+
     def update_column_type(self, schema_id, table_name, column_name, column_type):
         schema_name = 'schema-' + str(schema_id)
         db.engine.execute('ALTER DATABASE userdb SET datestyle TO "ISO, MDY";')
-        old_column_type = db.engine.execute(
-            "select data_type from information_schema.columns where table_name = '{}' and column_name='{}';".format(
-                table_name, column_name)).fetchone()[0]
+        old_column_type = dict(self._table_columns(schema_id, table_name))[column_name]
         try:
             db.engine.execute(
                 'ALTER TABLE {0}.{1} ALTER {2} TYPE {3} USING {2}::{3};'.format(
@@ -590,6 +1188,9 @@ class DataLoader:
             app.logger.error("[ERROR] Unable to update column type in table '{}'".format(table_name))
             app.logger.exception(e)
             raise e
+        finally:
+            table_columns.invalidate(schema_id, table_name)
+            table_versions.bump(schema_id, table_name)
 
         # Log action to history
         inverse_query = 'ALTER TABLE {0}.{1} ALTER {2} TYPE {3} USING {2}::{3};'.format(
@@ -598,143 +1199,480 @@ class DataLoader:
                            'Updated column ' + column_name + ' to have type ' + column_type, inverse_query)
 
     # Data uploading handling
+    def bulk_load(self, connection, schema_id, table_name, df):
+        """
+         This method loads the rows of a DataFrame into an existing table using COPY ... FROM STDIN.
+         The connection should be a raw (psycopg2) connection, committing is left to the caller.
+         Columns are matched on name, the id column is left to its default (serial) value.
+        """
+        schema_name = 'schema-' + str(schema_id)
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+
+        query = 'COPY {}.{} ({}) FROM STDIN WITH (FORMAT csv);'.format(*_ci(schema_name, table_name), ', '.join(
+            _ci(column) for column in df.columns))
+        try:
+            cursor = connection.cursor()
+            cursor.copy_expert(query, buffer)
+            cursor.close()
+        except Exception as e:
+            app.logger.error("[ERROR] Unable to bulk load data into table '" + table_name + "'")
+            app.logger.exception(e)
+            raise e
+
+    def copy_rows(self, connection, schema_id, table_name, columns, rows):
+        """
+         This method loads a list of rows (lists of strings, None for NULL) into the given columns of an existing table
+         using COPY ... FROM STDIN. The connection should be a raw (psycopg2) connection, committing is left to the caller.
+        """
+        schema_name = 'schema-' + str(schema_id)
+        # COPY's text format: tab separated, with backslash escapes and \N for NULL
+        escapes = str.maketrans({'\\': '\\\\', '\n': '\\n', '\r': '\\r', '\t': '\\t'})
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join('\\N' if value is None else value.translate(escapes) for value in row) + '\n')
+        buffer.seek(0)
+
+        query = 'COPY {}.{} ({}) FROM STDIN;'.format(*_ci(schema_name, table_name), ', '.join(
+            _ci(column) for column in columns))
+        try:
+            cursor = connection.cursor()
+            cursor.copy_expert(query, buffer)
+            cursor.close()
+        except Exception as e:
+            app.logger.error("[ERROR] Unable to bulk load data into table '" + table_name + "'")
+            app.logger.exception(e)
+            raise e
+
+    def copy_to_raw(self, connection, schema_id, table_name, columns, after_id=0):
+        """
+         This method copies the rows of a table with an id above after_id to its raw table, without the data
+         leaving the database. The connection should be a raw (psycopg2) connection, committing is left to the caller.
+        """
+        schema_name = 'schema-' + str(schema_id)
+        column_list = ', '.join(_ci(column) for column in columns)
+        try:
+            cursor = connection.cursor()
+            cursor.execute('INSERT INTO {0}.{1} ({3}) SELECT {3} FROM {0}.{2} WHERE id > {4} ORDER BY id;'.format(
+                *_ci(schema_name, '_raw_' + table_name, table_name), column_list, int(after_id)))
+            cursor.close()
+        except Exception as e:
+            app.logger.error("[ERROR] Unable to copy the data of table '" + table_name + "' to its raw table")
+            app.logger.exception(e)
+            raise e
+
     def process_csv(self, file, schema_id, tablename, table_description='Default description', append=False,
-                    type_deduction=False):
+                    type_deduction=False, chunk_size=None, progress=None):
         """
          This method takes a filename for a CSV file and processes it into a table.
          A table name should be provided by the user / caller of this method.
          If append = True, a table should already exist & the data will be added to this table
+         The file is read and loaded in chunks of chunk_size rows (CSV_CHUNK_SIZE by default), so memory usage
+         doesn't depend on the size of the file. With type_deduction, column types are inferred on a sample
+         of the first chunk; columns are widened (also in the database) if a later value doesn't fit.
+         progress, if given, is called with the amount of rows and bytes processed after every chunk.
         """
+        try:
+            self.load_chunks(self._csv_chunks(file, chunk_size or CSV_CHUNK_SIZE), file, schema_id, tablename,
+                             table_description, append=append, type_deduction=type_deduction, progress=progress)
+        except Exception as e:
+            app.logger.error("[ERROR] Failed to process csv")
+            raise e
+
+    def _csv_chunks(self, file, chunk_size):
+        for chunk in pd.read_csv(file, chunksize=chunk_size, dtype=str):
+            chunk.columns = [str(column).replace('"', '') for column in chunk.columns]
+            yield chunk
 
+    def process_jsonl(self, file, schema_id, tablename, table_description='Default description', append=False,
+                      chunk_size=None, progress=None):
+        """
+         This method takes a JSON Lines file (a JSON object per line, filename or file object) and processes it
+         into a table. Nested objects are flattened into columns named 'parent.child', arrays are stored as JSON.
+         Column types are inferred on a sample of the first chunk, columns that only show up in later records
+         are added as text columns. Lines that aren't a valid JSON object are skipped, their amount is returned.
+         If append = True, a table should already exist & the data will be added to this table
+        """
+        skipped = list()
         try:
-            table_exists = self.table_exists(tablename, schema_id)
-            if append and not table_exists:
-                app.logger.error("[ERROR] Appending to non-existent table.")
-                return
-            elif not append and table_exists:
-                app.logger.error("[ERROR] Cannot overwrite existing table.")
-                return
+            if not hasattr(file, 'read'):
+                with _open_file(file) as jsonl_file:
+                    self.load_chunks(self._jsonl_chunks(jsonl_file, chunk_size or CSV_CHUNK_SIZE, skipped),
+                                     jsonl_file, schema_id, tablename, table_description, append=append,
+                                     type_deduction=True, progress=progress)
+            else:
+                self.load_chunks(self._jsonl_chunks(file, chunk_size or CSV_CHUNK_SIZE, skipped), file, schema_id,
+                                 tablename, table_description, append=append, type_deduction=True, progress=progress)
+        except Exception as e:
+            app.logger.error("[ERROR] Failed to process jsonl")
+            raise e
 
-            raw_tablename = '_raw_' + tablename
-            schema_name = 'schema-' + str(schema_id)
+        if skipped:
+            app.logger.warning("[WARNING] Skipped {} invalid record(s) while loading table '{}', first on line {}".format(
+                len(skipped), tablename, skipped[0]))
+        return len(skipped)
+
+    def _jsonl_chunks(self, file, chunk_size, skipped):
+        records = list()
+        for line_number, line in enumerate(file, 1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', errors='replace')
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('Not a JSON object')
+            except ValueError:
+                skipped.append(line_number)
+                continue
 
-            with open(file, "r") as csv:
-                for line in csv:
-                    if not append:
-                        columns = line.strip().split(',')
-                        if not type_deduction:
-                            self.create_table(tablename, schema_id, columns, desc=table_description, raw=True)
-                        else:
-                            # Fancy
-                            self.create_table(tablename, schema_id, columns, desc=table_description, metadata_only=True)
-                    break
+            records.append(self._flatten_record(record))
+            if len(records) >= chunk_size:
+                yield self._records_to_frame(records)
+                records = list()
+        if records:
+            yield self._records_to_frame(records)
+
+    def _flatten_record(self, record, prefix='', flat=None):
+        """ Flattens a (nested) JSON object into an OrderedDict of column name -> string value (None for null) """
+        flat = OrderedDict() if flat is None else flat
+        for key, value in record.items():
+            column = (prefix + str(key)).replace('"', '')
+            if isinstance(value, dict):
+                self._flatten_record(value, column + '.', flat)
+            elif isinstance(value, list):
+                flat[column] = json.dumps(value)
+            elif isinstance(value, bool):
+                flat[column] = 'true' if value else 'false'
+            else:
+                flat[column] = None if value is None else str(value)
+        return flat
+
+    @staticmethod
+    def _records_to_frame(records):
+        # Columns in the order they first appear in
+        columns = OrderedDict()
+        for record in records:
+            for column in record:
+                columns.setdefault(column)
+        return pd.DataFrame.from_records(records, columns=list(columns))
+
+    def load_chunks(self, chunks, file, schema_id, tablename, table_description='Default description', append=False,
+                    type_deduction=False, progress=None):
+        """
+         This method loads DataFrames (of strings) into a table, creating it from the first one unless appending.
+         With type_deduction, column types are inferred on a sample of the first chunk; columns are widened
+         (also in the database) if a later value doesn't fit. Columns that show up in a later chunk are added.
+         file is only used to report the amount of bytes processed to progress.
+        """
+
+        table_exists = self.table_exists(tablename, schema_id)
+        if append and not table_exists:
+            raise ValueError("Table '{}' doesn't exist, rows can't be appended to it".format(tablename))
+        elif not append and table_exists:
+            raise ValueError("Table '{}' already exists".format(tablename))
+
+        schema_name = 'schema-' + str(schema_id)
+        raw_tablename = '_raw_' + tablename
+        table_created = False
+        type_inferrer = TypeInferrer()
 
-            df = pd.read_csv(file)
-            for column in df.columns:
-                if pd.api.types.is_string_dtype(df[column]):
-                    df[column] = pd.to_datetime(df[column], errors='ignore')
-            df.index.name = 'id'
-            df.to_sql(name=tablename, con=db.engine, schema=schema_name, index=type_deduction, if_exists='append')
-            df.to_sql(name=raw_tablename, con=db.engine, schema=schema_name, index=type_deduction, if_exists='append')
-            if type_deduction:
-                create_serial_sequence(schema_name, tablename)
+        connection = db.engine.raw_connection()
+        try:
+            # Only the working table is loaded, the new rows are copied to the raw table afterwards
+            after_id = 0
+            columns = list()
+            if append:
+                cursor = connection.cursor()
+                cursor.execute('SELECT COALESCE(MAX(id), 0) FROM {}.{};'.format(*_ci(schema_name, tablename)))
+                after_id = cursor.fetchone()[0]
+                cursor.close()
+                columns = self.get_column_names(schema_id, tablename)[1:]
+
+            first_chunk = True
+            position = _file_position(file)
+            for chunk in chunks:
+                widened_columns = list()
+                if type_deduction:
+                    if first_chunk and append:
+                        type_inferrer.use_table_types(self.get_column_names_and_types(schema_id, tablename))
+                    elif first_chunk:
+                        type_inferrer.infer(chunk)
+                    widened_columns = type_inferrer.convert(chunk)
+
+                if first_chunk and not append:
+                    column_types = type_inferrer.sql_types(chunk.columns) if type_deduction else None
+                    self.create_table(tablename, schema_id, list(chunk.columns), desc=table_description, raw=True,
+                                      column_types=column_types)
+                    table_created = True
+                    columns = list(chunk.columns)
+                else:
+                    cursor = connection.cursor()
+                    # Columns that fell back to a wider type are converted for the rows that were already loaded
+                    for column in widened_columns:
+                        if column not in columns:
+                            continue
+                        column_type = type_inferrer.SQL_TYPES[type_inferrer.types[column]]
+                        for table in [tablename, raw_tablename]:
+                            cursor.execute('ALTER TABLE {}.{} ALTER {} TYPE {} USING {}::{};'.format(
+                                *_ci(schema_name, table, column), column_type, _ci(column), column_type))
+                    for column in chunk.columns:
+                        if column in columns:
+                            continue
+                        column_type = type_inferrer.SQL_TYPES['text'] if type_deduction else 'varchar(255)'
+                        for table in [tablename, raw_tablename]:
+                            cursor.execute('ALTER TABLE {}.{} ADD COLUMN {} {};'.format(
+                                *_ci(schema_name, table, column), column_type))
+                        columns.append(column)
+                    cursor.close()
+                first_chunk = False
+
+                self.bulk_load(connection, schema_id, tablename, chunk)
+                if progress is not None:
+                    progress(len(chunk), _file_position(file) - position)
+                    position = _file_position(file)
+                del chunk
+
+            if first_chunk and not append:
+                raise ValueError("No data to load into table '" + tablename + "'")
+            if not first_chunk:
+                self.copy_to_raw(connection, schema_id, tablename, columns, after_id)
+            connection.commit()
+            row_counts.invalidate(schema_id, tablename)
+            table_versions.bump(schema_id, tablename)
+            table_columns.invalidate(schema_id, tablename)
+            row_counts.invalidate(schema_id, raw_tablename)
+            table_columns.invalidate(schema_id, raw_tablename)
+            table_versions.bump(schema_id, raw_tablename)
         except Exception as e:
-            app.logger.error("[ERROR] Failed to process csv")
+            connection.rollback()
+            app.logger.error("[ERROR] Failed to load data into table '" + tablename + "'")
             app.logger.exception(e)
             # delete all tables and entries where necessary
-            self.delete_table(tablename, schema_id)
+            if table_created:
+                self.delete_table(tablename, schema_id)
 
             raise e
+        finally:
+            connection.close()
 
-    def process_zip(self, file, schema_id, type_deduction=False):
+    def process_zip(self, file, schema_id, type_deduction=False, workers=None, progress=None):
         """
          This method takes a ZIP archive filled with CSV files, and processes them individually
          The name of the CSV file will be used as table name. If a table with the same name is found
          the data will be appended
+         The CSV files are read straight from the archive. Files for different tables are processed concurrently
+         by a pool of workers (ZIP_WORKERS by default), files for the same table are processed one after the other.
+         progress is passed on to process_csv, the bytes it reports are those of the uncompressed files.
         """
-        connection = db.engine.connect()
-        transaction = connection.begin()
         try:
-
+            # Group the CSV files on the table they should be loaded into
+            tables = OrderedDict()
             with ZipFile(file) as archive:
-                # Extract each file, one by one
-                members = archive.infolist()
-
-                for m in members:
-
-                    csv = archive.extract(m, "../output/temp")
-
-                    # Determine if this file should append an already existing table & process
+                for m in archive.infolist():
+                    if not m.filename.endswith('.csv'):
+                        continue
                     tablename = m.filename.split('.csv')[0]
                     tablename = tablename.split('/')[-1]
+                    tables.setdefault(tablename, list()).append(m.filename)
 
-                    create_new = not self.table_exists(tablename, schema_id)
-
-                    if create_new:
-                        self.process_csv(csv, schema_id, tablename, type_deduction=type_deduction)
-                    else:
-                        self.process_csv(csv, schema_id, tablename, True, type_deduction=type_deduction)
+            with ThreadPoolExecutor(max_workers=workers or ZIP_WORKERS) as executor:
+                futures = [executor.submit(self.process_zip_members, file, schema_id, tablename, members,
+                                           type_deduction, progress) for tablename, members in tables.items()]
 
-                # Clean up temp folder
-                shutil.rmtree("../output/temp")
-                transaction.commit()
+            errors = [future.exception() for future in futures if future.exception() is not None]
+            if len(errors):
+                raise errors[0]
 
         except Exception as e:
-            transaction.rollback()
-            app.logger.error("[ERROR] Failed to load from .zip archive '" + file + "'")
+            app.logger.error("[ERROR] Failed to load from .zip archive '" + str(file) + "'")
             app.logger.exception(e)
+            raise e
 
-            # Clean up temp folder
-            shutil.rmtree("../output/temp")
+    def process_zip_members(self, file, schema_id, tablename, members, type_deduction=False, progress=None):
+        """
+         This method processes CSV files from a ZIP archive into the same table, one after the other.
+         The first file creates the table if it doesn't exist yet, the others are appended.
+        """
+        with ZipFile(file) as archive:
+            for member in members:
+                with archive.open(member) as csv_file, self.load_lock(schema_id, tablename):
+                    create_new = not self.table_exists(tablename, schema_id)
+                    self.process_csv(csv_file, schema_id, tablename, append=not create_new, type_deduction=type_deduction,
+                                     progress=progress)
 
-            raise e
+    def load_lock(self, schema_id, tablename):
+        """
+         Returns the lock to hold while loading rows into a table, from checking whether it exists (to create it or
+         append to it) until the rows are committed.
+        """
+        with self.lock:
+            lock = self.load_locks.get((schema_id, tablename))
+            if lock is None:
+                lock = self.load_locks[(schema_id, tablename)] = threading.Lock()
+            return lock
 
-    def process_dump(self, file, schema_id, table_name, table_description='Default description', ):
+    def process_dump(self, file, schema_id, table_name, table_description='Default description', progress=None):
 
         """
          This method takes a SQL dump file and processes the INSERT statements,
          either by creating tables and filling them or by filling pre-existing tables.
          All other statements (DELETE, DROP, ...) won't be executed.
+         The dump is streamed through a SQLDumpReader, the rows are loaded per table in batches of CSV_CHUNK_SIZE rows.
+         file can be a filename (of a possibly compressed dump) or a file object. progress, if given, is called with the amount of rows and bytes
+         processed after every batch.
         """
-        connection = db.engine.connect()
-        transaction = connection.begin()
+        connection = db.engine.raw_connection()
+        created_tables = list()
         try:
-            with open(file, 'r') as dump:
-                # Read the file as a string, split on ';' and check each statement individually
-                for statement in dump.read().strip().split(';'):
-                    if len(statement.split()) and statement.split()[0] == 'INSERT':  # Only handle INSERT statements
-                        # NOTE: An INSERT statement looks like this:
-                        # INSERT INTO table_name (column1, column2, column3, ...) VALUES (value1, value2, value3, ...);
-
-                        tablename = statement.split()[2] or table_name
-                        raw_table_name = "_raw_" + tablename
-                        values_list = list()
-                        for values_tuple in re.findall(r'\(.*?\)', statement[statement.find('VALUES'):]):
-                            # Tuple is any match of the above regex, e.g. (values1, values2, values3, ...)
-                            # after VALUES, i.e. the column names (if they're given) aren't matched
-                            values_list.append(re.sub(r'\s|\(|\)', '', values_tuple).split(','))
-
-                        if re.search(r'{}\s\(.*?\)\sVALUES'.format(tablename), statement):
-                            # Matches 'table_name (column1, column2, column3, ...) VALUES', \s stands for whitespace
-                            columns = re.sub(r'\s|\(|\)', '',
-                                             re.findall(r'\(.*?\)', statement[:statement.find('VALUES')])[0]).split(',')
+            # Highest id & columns of every table before loading, to copy the new rows to the raw tables afterwards
+            loaded_tables = OrderedDict()
+            # Rows waiting to be loaded, per table and list of columns
+            batches = OrderedDict()
+            position = _file_position(file)
+            if not hasattr(file, 'read'):
+                dump = io.TextIOWrapper(_open_file(file))
+            else:
+                dump = file if isinstance(file, io.TextIOBase) else io.TextIOWrapper(file)
+            with dump:
+                for tablename, columns, values in SQLDumpReader(dump).rows():
+                    if columns is None:
+                        # NOTE: Without a column list the values are in the order of the table's columns
+                        if self.table_exists(tablename, schema_id):
+                            columns = self.get_column_names(schema_id, tablename)[1:len(values) + 1]
                         else:
-                            columns = ['col' + str(i) for i in range(1, len(values_list[0]) + 1)]
+                            columns = ['col' + str(i) for i in range(1, len(values) + 1)]
+                    columns = tuple(column.replace('"', '') for column in columns)
 
+                    if tablename not in loaded_tables:
                         if not self.table_exists(tablename, schema_id):
                             self.create_table(tablename, schema_id, columns, desc=table_description, raw=True)
-                        for values in values_list:
-                            val_dict = dict()
-                            for c_ix in range(len(columns)):
-                                val_dict[columns[c_ix]] = values[c_ix]
-                            self.insert_row(tablename, schema_id, columns, val_dict, False)
-                            self.insert_row(raw_table_name, schema_id, columns, val_dict, False)
-            transaction.commit()
+                            created_tables.append(tablename)
+                        cursor = connection.cursor()
+                        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM {}.{};'.format(
+                            *_ci('schema-' + str(schema_id), tablename)))
+                        loaded_tables[tablename] = (cursor.fetchone()[0],
+                                                    self.get_column_names(schema_id, tablename)[1:])
+                        cursor.close()
+
+                    batch = batches.setdefault((tablename, columns), list())
+                    batch.append(values)
+                    if len(batch) >= CSV_CHUNK_SIZE:
+                        self.copy_rows(connection, schema_id, tablename, columns, batch)
+                        if progress is not None:
+                            progress(len(batch), _file_position(file) - position)
+                            position = _file_position(file)
+                        del batch[:]
+
+                for (tablename, columns), batch in batches.items():
+                    if len(batch):
+                        self.copy_rows(connection, schema_id, tablename, columns, batch)
+                        if progress is not None:
+                            progress(len(batch), _file_position(file) - position)
+                            position = _file_position(file)
+            for tablename, (after_id, columns) in loaded_tables.items():
+                self.copy_to_raw(connection, schema_id, tablename, columns, after_id)
+            connection.commit()
+            for tablename in loaded_tables:
+                row_counts.invalidate(schema_id, tablename)
+                table_versions.bump(schema_id, tablename)
+                row_counts.invalidate(schema_id, '_raw_' + tablename)
+                table_versions.bump(schema_id, '_raw_' + tablename)
+                table_columns.invalidate(schema_id, tablename)
 
         except Exception as e:
-            transaction.rollback()
+            connection.rollback()
+            for tablename in created_tables:
+                self.delete_table(tablename, schema_id)
             app.logger.error("[ERROR] Failed to load from sql dump")
             app.logger.exception(e)
+            raise e
+        finally:
+            connection.close()
+
+    def process_parquet(self, file, schema_id, tablename, table_description='Default description', append=False,
+                        progress=None):
+        """
+         This method takes a Parquet file (filename or file object) and processes it into a table.
+         The column types are taken from the schema of the file, no type deduction is needed.
+         The file is loaded one row group at a time, so memory usage depends on the size of a row group.
+         If append = True, a table should already exist & the data will be added to this table
+        """
+        if pq is None:
+            raise RuntimeError("Parquet files can't be imported without pyarrow")
+
+        table_exists = self.table_exists(tablename, schema_id)
+        if append and not table_exists:
+            raise ValueError("Table '{}' doesn't exist, rows can't be appended to it".format(tablename))
+        elif not append and table_exists:
+            raise ValueError("Table '{}' already exists".format(tablename))
+
+        schema_name = 'schema-' + str(schema_id)
+        table_created = False
+        connection = db.engine.raw_connection()
+        try:
+            parquet_file = pq.ParquetFile(file)
+            schema = parquet_file.schema.to_arrow_schema()
+            columns = [str(name).replace('"', '') for name in schema.names]
+
+            after_id = 0
+            if append:
+                cursor = connection.cursor()
+                cursor.execute('SELECT COALESCE(MAX(id), 0) FROM {}.{};'.format(*_ci(schema_name, tablename)))
+                after_id = cursor.fetchone()[0]
+                cursor.close()
+            else:
+                column_types = [self._parquet_column_type(field.type) for field in schema]
+                self.create_table(tablename, schema_id, columns, desc=table_description, raw=True,
+                                  column_types=column_types)
+                table_created = True
+
+            for i in range(parquet_file.num_row_groups):
+                # Integer columns with nulls stay integers (instead of floats) as objects
+                df = parquet_file.read_row_group(i).to_pandas(integer_object_nulls=True)
+                df.columns = columns
+                self.bulk_load(connection, schema_id, tablename, df)
+                if progress is not None:
+                    row_group = parquet_file.metadata.row_group(i)
+                    progress(len(df), sum(row_group.column(c).total_compressed_size
+                                          for c in range(row_group.num_columns)))
+                del df
+
+            self.copy_to_raw(connection, schema_id, tablename, columns, after_id)
+            connection.commit()
+            row_counts.invalidate(schema_id, tablename)
+            table_versions.bump(schema_id, tablename)
+            row_counts.invalidate(schema_id, '_raw_' + tablename)
+            table_versions.bump(schema_id, '_raw_' + tablename)
+            table_columns.invalidate(schema_id, tablename)
+        except Exception as e:
+            connection.rollback()
+            app.logger.error("[ERROR] Failed to process parquet file")
+            app.logger.exception(e)
+            if table_created:
+                self.delete_table(tablename, schema_id)
+            raise e
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _parquet_column_type(arrow_type):
+        """ Returns the Postgres type for a column of a Parquet file """
+        if pa.types.is_boolean(arrow_type):
+            return 'boolean'
+        elif pa.types.is_integer(arrow_type):
+            return 'numeric' if arrow_type == pa.uint64() else 'bigint'
+        elif pa.types.is_floating(arrow_type):
+            return 'double precision'
+        elif pa.types.is_decimal(arrow_type):
+            return 'numeric'
+        elif pa.types.is_date(arrow_type):
+            return 'date'
+        elif pa.types.is_timestamp(arrow_type):
+            return 'timestamp with time zone' if arrow_type.tz else 'timestamp'
+        return 'text'
 
     # Data access handling
     def get_user_datasets(self, user_id):
@@ -909,63 +1847,702 @@ class DataLoader:
             app.logger.exception(e)
             raise e
 
-    def get_table(self, schema_id, table_name, offset=0, limit='ALL', ordering=None, search=None):
+    def get_table(self, schema_id, table_name, offset=0, limit='ALL', ordering=None, search=None, cursor=None,
+                  stream=False, columns=None, filters=None):
         """
          This method returns a list of 'Table' objects associated with the requested dataset
+         Pages are ordered on the ordering column and id. When a cursor (table.next_cursor or table.prev_cursor of
+         a previous page in the same ordering) is given, the page is found with a keyset condition on those columns
+         instead of the offset, so Postgres doesn't have to read and discard all preceding rows.
+         When stream is set, table.rows is an iterator reading the rows with a server-side cursor, the cursors of the
+         pages around the page are set once it's exhausted.
+         Columns limits the page to the given columns (id and the ordering column, which cursors point at, are read
+         as well) and filters to the rows meeting every filter, see _filter_conditions.
         """
+        projection = columns
         try:
             columns = self.get_column_names(schema_id, table_name)
 
             schema_name = 'schema-' + str(schema_id)
-            # Get all tables from the metadata table in the schema
-            ordering_query = ''
+            paged = 'id' in columns and (cursor is not None or str(limit).upper() != 'ALL')
+            if ordering is None and paged:
+                ordering = ('id', 'asc')
             if ordering is not None:
                 # ordering tuple is of the form (columns, asc|desc)
-                ordering_query = 'ORDER BY {} {}'.format(_ci(ordering[0]), ordering[1])
+                ordering = (ordering[0], 'desc' if str(ordering[1]).lower() == 'desc' else 'asc')
+                if 'id' in columns and ordering[0] != 'id' and ordering[0] in columns:
+                    self._use_sort_column(schema_id, table_name, ordering[0])
 
-            search_query = ''
+            selected = self._select_columns(schema_id, table_name, projection,
+                                            ['id'] + ([ordering[0]] if ordering is not None else []))
+
+            conditions = list()
             if search is not None and search != '':
-                search_query = "WHERE ("
                 # Fill in the search for every column except ID
-                for col in columns[1:]:
-                    search_query += "{}::text LIKE '%%{}%%' OR ".format(_ci(col), search)
-                search_query = search_query[:-3] + ")"
-
-            rows = db.engine.execute(
-                'SELECT * FROM {}.{} {} {} LIMIT {} OFFSET {};'.format(*_ci(schema_name, table_name), search_query,
-                                                                       ordering_query, limit, offset))
+                conditions.append(self._search_condition(columns[1:], search))
+                self._check_index(schema_id, table_name, 'search')
+            params = dict()
+            if filters:
+                conditions.extend(self._filter_conditions(self._table_columns(schema_id, table_name), filters, params))
+
+            direction = ordering[1] if ordering is not None else None
+            backward = False
+            keyset_conditions = [None]
+            if cursor is not None:
+                column, cursor_direction, value, row_id, backward = _read_cursor(cursor)
+                if (column, cursor_direction) != ordering:
+                    raise ValueError("Cursor doesn't match the ordering")
+                offset = 0
+                # Going back a page is going forward in the opposite direction
+                direction = {'asc': 'desc', 'desc': 'asc'}[direction] if backward else direction
+                keyset_conditions = self._keyset_conditions(column, direction, value, row_id)
+
+            def ordering_query(direction):
+                if ordering is None:
+                    return ''
+                if 'id' in columns and ordering[0] != 'id':
+                    return 'ORDER BY {0} {1}, id {1}'.format(_ci(ordering[0]), direction)
+                return 'ORDER BY {} {}'.format(_ci(ordering[0]), direction)
+
+            selects = list()
+            for keyset_condition in keyset_conditions:
+                where = conditions + [keyset_condition] if keyset_condition else conditions
+                selects.append('SELECT {} FROM {}.{} {} {} LIMIT {} OFFSET {}'.format(
+                    self._select_list(columns, selected), *_ci(schema_name, table_name),
+                    'WHERE ' + ' AND '.join(where) if where else '', ordering_query(direction), limit, offset))
+            query = selects[0]
+            if len(selects) > 1:
+                # Every part can be read from an index on (column, id), only their first rows need to be merged
+                query = 'SELECT * FROM ({}) AS page {} LIMIT {}'.format(
+                    ' UNION ALL '.join('(' + select + ')' for select in selects), ordering_query(direction), limit)
+            if backward:
+                # The page was read in the opposite direction
+                query = 'SELECT * FROM ({}) AS page {}'.format(query, ordering_query(ordering[1]))
 
             # Get total size (of unfiltered table)
-            size_query = 'SELECT count(*) FROM {}.{};'.format(*_ci(schema_name, table_name))
-            size_result = db.engine.execute(size_query)
-            table_size = [r[0] for r in size_result][0]
+            table_size = self.count_rows(schema_id, table_name)
 
-            table = Table(table_name, '',
-                          columns=self.get_column_names_and_types(schema_id, table_name), total_size=table_size)
+            table = Table(table_name, '', columns=self._selected_columns(schema_id, table_name, selected),
+                          total_size=table_size)
             table.dataset = schema_id
-            for row in rows:
-                table.rows.append(list(row))
+            if conditions:
+                table.filtered_size = self.count_rows(
+                    schema_id, table_name, search=self._count_key(search, filters), condition=' AND '.join(conditions),
+                    params=params)
+
+            def page(rows):
+                first = last = None
+                count = 0
+                for row in rows:
+                    first = row if first is None else first
+                    last = row
+                    count += 1
+                    yield list(row)
+                if paged and count:
+                    if backward or (str(limit).upper() != 'ALL' and count == int(limit)):
+                        table.next_cursor = _make_cursor(ordering, last)
+                    if cursor is not None or int(offset):
+                        table.prev_cursor = _make_cursor(ordering, first, backward=True)
+
+            if stream:
+                table.rows = page(self._stream_rows(query + ';', params))
+            else:
+                table.rows = list(page(db.engine.execute(query + ';', params)))
             return table
 
         except Exception as e:
+            if filters and isinstance(e, DataError):
+                # A filter value that can't be cast to the type of its column
+                raise ValueError('Invalid filter value: ' + str(e.orig).splitlines()[0])
             app.logger.error("[ERROR] Couldn't fetch table for dataset.")
             app.logger.exception(e)
             raise e
 
+    def get_table_outline(self, schema_id, table_name):
+        """
+         Returns a 'Table' with the columns of a table but without its rows (or their count), for pages that load its
+         rows through the API. The table itself isn't read, so this takes as long for any size of table.
+        """
+        columns = self.get_column_names_and_types(schema_id, table_name)
+        if not columns:
+            raise ValueError("Table '{}' doesn't exist".format(table_name))
+        table = Table(table_name, '', columns=columns)
+        table.dataset = schema_id
+        return table
+
+    def _stream_rows(self, query, params=None):
+        """
+         Runs a query on a server-side cursor (stream_results makes psycopg2 use a named cursor) and returns an
+         iterator over its rows, which are fetched STREAM_BATCH_SIZE at a time. The query runs right away, so errors
+         in it are raised here rather than while iterating.
+        """
+        connection = db.engine.connect().execution_options(stream_results=True)
+        try:
+            result = connection.execute(query, params or {})
+        except Exception:
+            connection.close()
+            raise
+
+        def rows():
+            try:
+                while True:
+                    batch = result.fetchmany(STREAM_BATCH_SIZE)
+                    if not batch:
+                        break
+                    yield from batch
+            finally:
+                connection.close()
+        return rows()
+
+    def count_rows(self, schema_id, table_name, search=None, condition=None, params=None):
+        """
+         Returns the amount of rows in a table, or the amount of rows matching a search if the condition selecting
+         them (and the parameters bound in it) is given. Counts are cached until the table changes. Tables that
+         Postgres estimates to hold at least ROW_COUNT_ESTIMATE_THRESHOLD rows aren't counted, the estimate (from the
+         last VACUUM or ANALYZE) is used.
+        """
+        count = row_counts.get(schema_id, table_name, search)
+        if count is not None:
+            return count
+        # Read before counting, a count of a table that changed meanwhile isn't kept
+        version = table_versions.get(schema_id, table_name)
+        schema_name = 'schema-' + str(schema_id)
+        try:
+            if condition is None:
+                estimate = db.engine.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = {}::regclass;'.format(
+                    _cv('{}.{}'.format(*_ci(schema_name, table_name))))).fetchone()[0]
+                if estimate >= ROW_COUNT_ESTIMATE_THRESHOLD:
+                    return estimate
+
+            count = db.engine.execute('SELECT count(*) FROM {}.{} {};'.format(
+                *_ci(schema_name, table_name), 'WHERE ' + condition if condition else ''), params or {}).fetchone()[0]
+            row_counts.set(schema_id, table_name, version, count, search)
+            return count
+        except Exception as e:
+            if params and isinstance(e, DataError):
+                # A filter value that can't be cast to the type of its column, the caller reports it
+                raise e
+            app.logger.error("[ERROR] Couldn't count the rows of table '" + table_name + "'")
+            app.logger.exception(e)
+            raise e
+
+    def _select_columns(self, schema_id, table_name, columns, required):
+        """
+         Returns the names of the columns to read from a table: all of them when columns is None, else the required
+         ones (that exist) followed by the given ones.
+        """
+        names = self.get_column_names(schema_id, table_name)
+        if columns is None:
+            return names
+        for column in columns:
+            if column not in names:
+                raise ValueError("Unknown column '{}'".format(column))
+        return list(OrderedDict.fromkeys([column for column in required if column in names] + list(columns)))
+
+    @staticmethod
+    def _select_list(names, selected):
+        return '*' if selected == names else ', '.join(_ci(column) for column in selected)
+
+    def _selected_columns(self, schema_id, table_name, selected):
+        """ Returns the 'Column' objects of the selected columns, in the order they're selected """
+        columns = {column.name: column for column in self.get_column_names_and_types(schema_id, table_name)}
+        return [columns[name] for name in selected]
+
+    @staticmethod
+    def _count_key(search, filters):
+        """ Returns the key the count of rows matching a search (and filters) is cached under """
+        if not filters:
+            return search
+        return 'filters', search, json.dumps(filters, default=str)
+
+    @staticmethod
+    def _filter_conditions(columns, filters, params):
+        """
+         Returns the conditions for a list of filters, (column, operator, value) triples with one of the
+         FILTER_OPERATORS: a comparison with a value, 'in' a list of values, 'between' a list of two values (both
+         included), or 'null' and 'not null' (which ignore the value). Columns are the (name, type) pairs of the
+         table. Values are added to params and bound as query parameters cast to the type of their column, the
+         column itself isn't cast so indexes on it can be used.
+        """
+        types = dict(columns)
+
+        def parameter(column, value):
+            if value is None or isinstance(value, (list, tuple, dict)):
+                raise ValueError("Invalid value for filter on column '{}'".format(column))
+            name = 'filter_{}'.format(len(params))
+            params[name] = value
+            return '%({})s::{}'.format(name, types[column])
+
+        conditions = list()
+        for column, operator, value in filters:
+            if column not in types:
+                raise ValueError("Unknown column '{}'".format(column))
+            operator = str(operator).lower()
+            if operator not in FILTER_OPERATORS:
+                raise ValueError("Unknown filter operator '{}'".format(operator))
+            if operator == 'null':
+                conditions.append('{} IS NULL'.format(_ci(column)))
+            elif operator == 'not null':
+                conditions.append('{} IS NOT NULL'.format(_ci(column)))
+            elif operator == 'in':
+                if not isinstance(value, (list, tuple)) or not value:
+                    raise ValueError("Filter 'in' on column '{}' needs a list of values".format(column))
+                conditions.append('{} IN ({})'.format(
+                    _ci(column), ', '.join(parameter(column, item) for item in value)))
+            elif operator == 'between':
+                if not isinstance(value, (list, tuple)) or len(value) != 2:
+                    raise ValueError("Filter 'between' on column '{}' needs two values".format(column))
+                conditions.append('{} BETWEEN {} AND {}'.format(
+                    _ci(column), parameter(column, value[0]), parameter(column, value[1])))
+            else:
+                conditions.append('{} {} {}'.format(_ci(column), operator, parameter(column, value)))
+        return conditions
+
+    @staticmethod
+    def _search_condition(columns, search):
+        """ Returns the condition for rows containing the search term in any of the columns (as text) """
+        pattern = _cv('%' + re.sub(r'([\\%_])', r'\\\1', search) + '%').replace('%', '%%')
+        if not columns:
+            return 'FALSE'
+        return '(' + ' OR '.join('{}::text LIKE {}'.format(_ci(column), pattern) for column in columns) + ')'
+
+    def has_search_index(self, schema_id, table_name):
+        try:
+            return db.engine.execute('SELECT EXISTS(SELECT 1 FROM Search_Index WHERE id_dataset={} AND id_table={});'
+                                     .format(*_cv('schema-' + str(schema_id), table_name))).first()[0]
+        except Exception as e:
+            app.logger.error("[ERROR] Couldn't find if table '" + table_name + "' has a search index")
+            app.logger.exception(e)
+            raise e
+
+    def create_search_index(self, schema_id, table_name, background=False):
+        """
+         Gives a table a search index: a trigram (pg_trgm) GIN index on the text of every column of one of the
+         SEARCH_INDEX_TYPES, which can serve the LIKE '%term%' conditions of a search. The indexes are kept up to date
+         by update_search_index.
+        """
+        try:
+            db.engine.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm;')
+            if not self.has_search_index(schema_id, table_name):
+                db.engine.execute('INSERT INTO Search_Index VALUES ({}, {});'.format(
+                    *_cv('schema-' + str(schema_id), table_name)))
+        except Exception as e:
+            app.logger.error("[ERROR] Unable to create a search index for table '" + table_name + "'")
+            app.logger.exception(e)
+            raise e
+        self.update_search_index(schema_id, table_name, background=background)
+
+    def delete_search_index(self, schema_id, table_name):
+        schema_name = 'schema-' + str(schema_id)
+        try:
+            db.engine.execute('DELETE FROM Search_Index WHERE id_dataset={} AND id_table={};'.format(
+                *_cv(schema_name, table_name)))
+            for index in self._search_indexes(schema_id, table_name):
+                self._execute_concurrently('DROP INDEX CONCURRENTLY IF EXISTS {}.{};'.format(*_ci(schema_name, index)))
+        except Exception as e:
+            app.logger.error("[ERROR] Unable to delete the search index of table '" + table_name + "'")
+            app.logger.exception(e)
+            raise e
+
+    def update_search_index(self, schema_id, table_name, background=False):
+        """
+         Creates the trigram indexes that are missing for the columns of a table with a search index, as after a
+         column was added or a transformation rewrote the table, and drops those of columns that were renamed (or got
+         another type). The indexes are built with CREATE INDEX CONCURRENTLY, so the table can still be changed
+         meanwhile. With background, they are built in a separate thread (searches don't use them until they are done).
+        """
+        schema_name = 'schema-' + str(schema_id)
+        columns = {self._search_index_name(table_name, column): column
+                   for column, type in self._table_columns(schema_id, table_name)
+                   if column != 'id' and type in SEARCH_INDEX_TYPES}
+        existing = self._search_indexes(schema_id, table_name)
+        # A build that failed leaves an invalid index behind, it's built again
+        missing = [index for index in columns if index not in self._search_indexes(schema_id, table_name, valid=True)]
+        if not missing and existing.issubset(columns):
+            return
+
+        def update():
+            error = None
+            try:
+                for index in existing - set(columns):
+                    self._execute_concurrently('DROP INDEX CONCURRENTLY IF EXISTS {}.{};'.format(
+                        *_ci(schema_name, index)))
+                for index in missing:
+                    # One column failing doesn't keep the other columns from being indexed
+                    try:
+                        self._execute_concurrently('DROP INDEX CONCURRENTLY IF EXISTS {}.{};'.format(
+                            *_ci(schema_name, index)))
+                        self._execute_concurrently('CREATE INDEX CONCURRENTLY {} ON {}.{} USING gin (({}::text) '
+                                                   'gin_trgm_ops);'.format(*_ci(index, schema_name, table_name,
+                                                                                columns[index])))
+                    except Exception as e:
+                        error = error or e
+                        app.logger.error("[ERROR] Unable to index column '{}' of table '{}' for searches".format(
+                            columns[index], table_name))
+                        app.logger.exception(e)
+                if error is not None:
+                    raise error
+            except Exception as e:
+                app.logger.error("[ERROR] Unable to update the search index of table '" + table_name + "'")
+                app.logger.exception(e)
+                raise e
+            finally:
+                with self.lock:
+                    self.index_builds.discard((schema_name, table_name))
+
+        with self.lock:
+            if (schema_name, table_name) in self.index_builds:
+                return
+            self.index_builds.add((schema_name, table_name))
+        if background:
+            threading.Thread(target=update, daemon=True).start()
+        else:
+            update()
+
+    def _check_index(self, schema_id, table_name, kind):
+        """
+         Brings the index of a table of the given kind ('search' or 'full-text') up to date in the background, unless
+         it was already checked since the table last changed. Every change to the rows or columns of a table (or to
+         its full-text index) changes its version, so searches don't look the index up in the catalog every time.
+        """
+        version = table_versions.get(schema_id, table_name)
+        key = (kind, 'schema-' + str(schema_id), table_name)
+        with self.lock:
+            if self.index_checks.get(key) == version:
+                return
+        if kind == 'full-text':
+            self.update_full_text_index(schema_id, table_name, background=True)
+        elif self.has_search_index(schema_id, table_name):
+            self.update_search_index(schema_id, table_name, background=True)
+        with self.lock:
+            self.index_checks.pop(key, None)
+            self.index_checks[key] = version
+            while len(self.index_checks) > INDEX_CHECKS_KEPT:
+                self.index_checks.popitem(last=False)
+
+    @staticmethod
+    def _search_index_name(table_name, column):
+        return '_trgm_' + hashlib.md5((table_name + '\0' + column).encode()).hexdigest()[:24]
+
+    def _search_indexes(self, schema_id, table_name, valid=False):
+        """ Returns the names of the trigram indexes of a table's search index, or only of those that are valid """
+        rows = db.engine.execute(
+            "SELECT indexname FROM pg_indexes JOIN pg_index ON indexrelid=to_regclass(quote_ident(schemaname) || '.' || "
+            "quote_ident(indexname)) WHERE schemaname={} AND tablename={} AND indexname LIKE '\\_trgm\\_%%' {};".format(
+                *_cv('schema-' + str(schema_id), table_name), 'AND indisvalid' if valid else ''))
+        return set(row[0] for row in rows)
+
+    def _use_sort_column(self, schema_id, table_name, column):
+        """
+         Keeps track of the columns the pages of a table are sorted on. A column sorted on AUTO_INDEX_THRESHOLD times,
+         in a table of at least AUTO_INDEX_MIN_ROWS rows, gets a sort index (see create_sort_index). Sort indexes that
+         went missing, because a transformation rewrote the table, are built again when they're used.
+         The use of a sort index (which decides the ones dropped to make room) is recorded at most once every
+         AUTO_INDEX_REFRESH_SECONDS, so pages sorted on it don't all write to Auto_Index.
+        """
+        schema_name = 'schema-' + str(schema_id)
+        key = (schema_name, table_name, column)
+        now = time.monotonic()
+        with self.lock:
+            recorded = self.sort_index_uses.get(key)
+        if recorded is not None and now - recorded < AUTO_INDEX_REFRESH_SECONDS:
+            return
+
+        index = _ci(schema_name) + '.' + _ci(self._sort_index_name(table_name, column))
+        row = db.engine.execute(
+            'UPDATE Auto_Index SET last_used=now() WHERE id_dataset={} AND id_table={} AND column_name={} RETURNING '
+            'COALESCE((SELECT indisvalid FROM pg_index WHERE indexrelid=to_regclass({})), FALSE);'.format(
+                *_cv(schema_name, table_name, column, index))).first()
+        if row is not None:
+            with self.lock:
+                self.sort_index_uses.pop(key, None)
+                self.sort_index_uses[key] = now
+                while len(self.sort_index_uses) > AUTO_INDEX_TRACKED_COLUMNS:
+                    self.sort_index_uses.popitem(last=False)
+            if not row[0]:
+                self.create_sort_index(schema_id, table_name, column, background=True)
+            return
+
+        with self.lock:
+            uses = self.sort_uses.pop(key, 0) + 1
+            self.sort_uses[key] = uses
+            while len(self.sort_uses) > AUTO_INDEX_TRACKED_COLUMNS:
+                self.sort_uses.popitem(last=False)
+        if uses >= AUTO_INDEX_THRESHOLD and self.count_rows(schema_id, table_name) >= AUTO_INDEX_MIN_ROWS:
+            self.create_sort_index(schema_id, table_name, column, background=True)
+
+    def create_sort_index(self, schema_id, table_name, column, background=False):
+        """
+         Gives a column a sort index: a b-tree index on (column, id), which serves both the ordering of the pages of a
+         table and the keyset conditions of their cursors. It's built with CREATE INDEX CONCURRENTLY, so the table can
+         still be changed meanwhile. A dataset has at most AUTO_INDEX_BUDGET sort indexes, the least recently used
+         ones are dropped to make room.
+        """
+        schema_name = 'schema-' + str(schema_id)
+        index = self._sort_index_name(table_name, column)
+
+        def create():
+            try:
+                rows = db.engine.execute(
+                    'SELECT id_table, column_name FROM Auto_Index WHERE id_dataset={} AND NOT (id_table={} AND '
+                    'column_name={}) ORDER BY last_used DESC OFFSET {};'.format(
+                        *_cv(schema_name, table_name, column), max(AUTO_INDEX_BUDGET - 1, 0))).fetchall()
+                for other_table, other_column in rows:
+                    self.delete_sort_index(schema_id, other_table, other_column)
+                db.engine.execute(
+                    'INSERT INTO Auto_Index VALUES ({}, {}, {}, now()) ON CONFLICT (id_dataset, id_table, column_name) '
+                    'DO UPDATE SET last_used=now();'.format(*_cv(schema_name, table_name, column)))
+                # A build that failed leaves an invalid index behind
+                self._execute_concurrently('DROP INDEX CONCURRENTLY IF EXISTS {}.{};'.format(*_ci(schema_name, index)))
+                self._execute_concurrently('CREATE INDEX CONCURRENTLY {} ON {}.{} ({}, id);'.format(
+                    *_ci(index, schema_name, table_name, column)))
+            except Exception as e:
+                app.logger.error("[ERROR] Unable to create a sort index on column '{}' of table '{}'".format(
+                    column, table_name))
+                app.logger.exception(e)
+                db.engine.execute('DELETE FROM Auto_Index WHERE id_dataset={} AND id_table={} AND column_name={};'
+                                  .format(*_cv(schema_name, table_name, column)))
+                raise e
+            finally:
+                with self.lock:
+                    self.index_builds.discard((schema_name, index))
+
+        with self.lock:
+            if (schema_name, index) in self.index_builds:
+                return
+            self.index_builds.add((schema_name, index))
+            self.sort_uses.pop((schema_name, table_name, column), None)
+        if background:
+            threading.Thread(target=create, daemon=True).start()
+        else:
+            create()
+
+    def delete_sort_index(self, schema_id, table_name, column):
+        schema_name = 'schema-' + str(schema_id)
+        try:
+            db.engine.execute('DELETE FROM Auto_Index WHERE id_dataset={} AND id_table={} AND column_name={};'.format(
+                *_cv(schema_name, table_name, column)))
+            with self.lock:
+                self.sort_index_uses.pop((schema_name, table_name, column), None)
+            self._execute_concurrently('DROP INDEX CONCURRENTLY IF EXISTS {}.{};'.format(
+                *_ci(schema_name, self._sort_index_name(table_name, column))))
+        except Exception as e:
+            app.logger.error("[ERROR] Unable to delete the sort index on column '{}' of table '{}'".format(
+                column, table_name))
+            app.logger.exception(e)
+            raise e
+
+    def get_sort_indexes(self, schema_id, table_name):
+        """ Returns the columns of a table that have a sort index """
+        rows = db.engine.execute('SELECT column_name FROM Auto_Index WHERE id_dataset={} AND id_table={};'.format(
+            *_cv('schema-' + str(schema_id), table_name)))
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _sort_index_name(table_name, column):
+        return '_sort_' + hashlib.md5((table_name + '\0' + column).encode()).hexdigest()[:24]
+
+    @staticmethod
+    def _execute_concurrently(query):
+        """ Runs a query outside of a transaction, as (CREATE|DROP) INDEX CONCURRENTLY requires """
+        connection = db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            connection.execute(query)
+        finally:
+            connection.close()
+
+    def get_full_text_index(self, schema_id, table_name):
+        """ Returns the (language, columns) of the full-text index of a table, or None if it hasn't got one """
+        try:
+            row = db.engine.execute('SELECT language, columns FROM Full_Text_Index WHERE id_dataset={} AND id_table={};'
+                                    .format(*_cv('schema-' + str(schema_id), table_name))).first()
+            return (row[0], json.loads(row[1])) if row else None
+        except Exception as e:
+            app.logger.error("[ERROR] Couldn't find the full-text index of table '" + table_name + "'")
+            app.logger.exception(e)
+            raise e
+
+    def get_full_text_languages(self):
+        """ Returns the languages (text search configurations) a full-text index can use """
+        return [row[0] for row in db.engine.execute('SELECT cfgname FROM pg_ts_config ORDER BY cfgname;')]
+
+    def create_full_text_index(self, schema_id, table_name, columns=None, language='english', background=False):
+        """
+         Gives a table a full-text index: a GIN index on the tsvector of the given text columns (by default, all of
+         them) in the given language (a Postgres text search configuration), which search_full_text uses.
+        """
+        text_columns = [column.name for column in self.get_column_names_and_types(schema_id, table_name)
+                        if column.name != 'id' and column.type in ['text', 'character varying', 'character']]
+        columns = columns or text_columns
+        if not columns or not set(columns).issubset(text_columns):
+            raise ValueError("A full-text index needs text columns")
+        if not db.engine.execute('SELECT EXISTS(SELECT 1 FROM pg_ts_config WHERE cfgname={});'.format(
+                _cv(language))).first()[0]:
+            raise ValueError("Unknown language '{}'".format(language))
+
+        schema_name = 'schema-' + str(schema_id)
+        try:
+            db.engine.execute('DELETE FROM Full_Text_Index WHERE id_dataset={} AND id_table={};'.format(
+                *_cv(schema_name, table_name)))
+            db.engine.execute('DROP INDEX IF EXISTS {}.{};'.format(
+                *_ci(schema_name, self._full_text_index_name(table_name))))
+            db.engine.execute('INSERT INTO Full_Text_Index VALUES ({}, {}, {}, {});'.format(
+                *_cv(schema_name, table_name, language, json.dumps(columns))))
+            # Cached full-text search results were found with the old index
+            table_versions.bump(schema_id, table_name)
+        except Exception as e:
+            app.logger.error("[ERROR] Unable to create a full-text index for table '" + table_name + "'")
+            app.logger.exception(e)
+            raise e
+        self.update_full_text_index(schema_id, table_name, background=background)
+
+    def delete_full_text_index(self, schema_id, table_name):
+        schema_name = 'schema-' + str(schema_id)
+        try:
+            db.engine.execute('DELETE FROM Full_Text_Index WHERE id_dataset={} AND id_table={};'.format(
+                *_cv(schema_name, table_name)))
+            db.engine.execute('DROP INDEX IF EXISTS {}.{};'.format(
+                *_ci(schema_name, self._full_text_index_name(table_name))))
+            table_versions.bump(schema_id, table_name)
+        except Exception as e:
+            app.logger.error("[ERROR] Unable to delete the full-text index of table '" + table_name + "'")
+            app.logger.exception(e)
+            raise e
+
+    def update_full_text_index(self, schema_id, table_name, background=False):
+        """
+         Builds the full-text index of a table again if it is missing (or invalid, after a build that failed), as after
+         a transformation rewrote the table, leaving out columns that were deleted. It's built with CREATE INDEX
+         CONCURRENTLY, so the table can still be changed meanwhile. With background, it is built in a separate thread.
+        """
+        full_text_index = self.get_full_text_index(schema_id, table_name)
+        if full_text_index is None:
+            return
+        schema_name = 'schema-' + str(schema_id)
+        index = self._full_text_index_name(table_name)
+        language, columns = full_text_index
+        existing_columns = [column for column in columns if column in self.get_column_names(schema_id, table_name)]
+        if existing_columns == columns and db.engine.execute(
+                'SELECT COALESCE((SELECT indisvalid FROM pg_index WHERE indexrelid=to_regclass({})), FALSE);'.format(
+                    _cv(_ci(schema_name) + '.' + _ci(index)))).first()[0]:
+            return
+
+        def update():
+            try:
+                db.engine.execute('UPDATE Full_Text_Index SET columns={} WHERE id_dataset={} AND id_table={};'.format(
+                    *_cv(json.dumps(existing_columns), schema_name, table_name)))
+                self._execute_concurrently('DROP INDEX CONCURRENTLY IF EXISTS {}.{};'.format(*_ci(schema_name, index)))
+                if existing_columns:
+                    self._execute_concurrently('CREATE INDEX CONCURRENTLY {} ON {}.{} USING gin ({});'.format(
+                        *_ci(index, schema_name, table_name), self._full_text_vector(language, existing_columns)))
+            except Exception as e:
+                app.logger.error("[ERROR] Unable to update the full-text index of table '" + table_name + "'")
+                app.logger.exception(e)
+                raise e
+            finally:
+                with self.lock:
+                    self.index_builds.discard((schema_name, index))
+
+        with self.lock:
+            if (schema_name, index) in self.index_builds:
+                return
+            self.index_builds.add((schema_name, index))
+        if background:
+            threading.Thread(target=update, daemon=True).start()
+        else:
+            update()
+
+    def search_full_text(self, schema_id, table_name, query, offset=0, limit='ALL', stream=False, columns=None,
+                         filters=None):
+        """
+         Returns a 'Table' with the rows of a table with a full-text index that match the query, most relevant first.
+         The query consists of words (all of which should occur), "quoted phrases" and prefixes ending with '*'.
+         Matching rows are found with the index, only they are ranked. Stream, columns and filters work like they do
+         for get_table.
+        """
+        full_text_index = self.get_full_text_index(schema_id, table_name)
+        if full_text_index is None:
+            raise ValueError("Table '{}' has no full-text index".format(table_name))
+        self._check_index(schema_id, table_name, 'full-text')
+        schema_name = 'schema-' + str(schema_id)
+        vector = self._full_text_vector(*full_text_index)
+        ts_query = self._full_text_query(full_text_index[0], query)
+        try:
+            selected = self._select_columns(schema_id, table_name, columns, ['id'])
+            params = dict()
+            conditions = ['{} @@ {}'.format(vector, ts_query)]
+            if filters:
+                conditions.extend(self._filter_conditions(self._table_columns(schema_id, table_name), filters, params))
+            select = 'SELECT {} FROM {}.{} WHERE {} ORDER BY ts_rank({}, {}) DESC, id LIMIT {} OFFSET {};'.format(
+                self._select_list(self.get_column_names(schema_id, table_name), selected),
+                *_ci(schema_name, table_name), ' AND '.join(conditions), vector, ts_query, limit, offset)
+            table = Table(table_name, '', columns=self._selected_columns(schema_id, table_name, selected),
+                          total_size=self.count_rows(schema_id, table_name))
+            table.dataset = schema_id
+            if stream:
+                table.rows = (list(row) for row in self._stream_rows(select, params))
+            else:
+                table.rows = [list(row) for row in db.engine.execute(select, params)]
+            table.filtered_size = self.count_rows(schema_id, table_name,
+                                                  search=('full-text', self._count_key(query, filters)),
+                                                  condition=' AND '.join(conditions), params=params)
+            return table
+        except Exception as e:
+            if filters and isinstance(e, DataError):
+                raise ValueError('Invalid filter value: ' + str(e.orig).splitlines()[0])
+            app.logger.error("[ERROR] Couldn't search table '" + table_name + "'")
+            app.logger.exception(e)
+            raise e
+
+    @staticmethod
+    def _full_text_index_name(table_name):
+        return '_fts_' + hashlib.md5(table_name.encode()).hexdigest()[:24]
+
+    @staticmethod
+    def _full_text_vector(language, columns):
+        """ Returns the tsvector expression of the full-text index, queries have to use the same one """
+        return "to_tsvector({}::regconfig, {})".format(_cv(language), " || ' ' || ".join(
+            "coalesce({}::text, '')".format(_ci(column)) for column in columns))
+
+    @staticmethod
+    def _full_text_query(language, query):
+        """ Returns the tsquery for a full-text search: "phrases", prefixes* and words all have to match """
+        language = _cv(language) + '::regconfig'
+        parts = list()
+        for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+            if phrase:
+                parts.append('phraseto_tsquery({}, {})'.format(language, _cv(phrase)))
+            elif word.endswith('*') and re.sub(r'\W', '', word):
+                parts.append("to_tsquery({}, {})".format(language, _cv(re.sub(r'\W', '', word) + ':*')))
+            else:
+                parts.append('plainto_tsquery({}, {})'.format(language, _cv(word)))
+        return '(' + (' && '.join(parts) or "''::tsquery").replace('%', '%%') + ')'
+
+    @staticmethod
+    def _keyset_conditions(column, direction, value, row_id):
+        """
+         Returns the conditions for the rows after (value, row_id) when ordering on column and id in the given
+         direction, with NULLs last for ascending and first for descending order as Postgres sorts them.
+         Every condition is a range of an index on (column, id), the rows after are the union of those ranges.
+        """
+        if column == 'id':
+            return ['id {} {}'.format('>' if direction == 'asc' else '<', row_id)]
+        column = _ci(column)
+        if value is None:
+            if direction == 'asc':
+                return ['{} IS NULL AND id > {}'.format(column, row_id)]
+            return ['{} IS NULL AND id < {}'.format(column, row_id), '{} IS NOT NULL'.format(column)]
+        value = _cv(value.replace('%', '%%'))
+        if direction == 'asc':
+            return ['({}, id) > ({}, {})'.format(column, value, row_id), '{} IS NULL'.format(column)]
+        return ['({}, id) < ({}, {})'.format(column, value, row_id)]
+
     def get_column_names(self, schema_id, table_name):
         """
          This method returns a list of column names associated with the given table
         """
         try:
-            schema = "schema-" + str(schema_id)
-            rows = db.engine.execute(
-                'SELECT column_name FROM information_schema.columns WHERE table_schema={} AND table_name={};'.format(
-                    *_cv(schema, table_name))).fetchall()
-            result = list()
-            for row in rows:
-                result.append(row[0])
-
-            return result
+            return [column for column, _ in self._table_columns(schema_id, table_name)]
 
         except Exception as e:
             app.logger.error("[ERROR] Couldn't fetch column names for table '" + table_name + "'.")
@@ -977,12 +2554,8 @@ class DataLoader:
          This method returns a list of column names associated with the given table
         """
         try:
-            schema = "schema-" + str(schema_id)
-            rows = db.engine.execute(
-                'SELECT column_name, data_type FROM information_schema.columns WHERE table_schema={} AND table_name={};'.format(
-                    *_cv(schema, table_name)))
             result = list()
-            for row in rows:
+            for row in self._table_columns(schema_id, table_name):
                 type = row[1]
                 if type == "double precision":
                     type = "double"
@@ -999,6 +2572,23 @@ class DataLoader:
             app.logger.exception(e)
             raise e
 
+    def _table_columns(self, schema_id, table_name):
+        """
+         Returns the (name, data type) pairs of the columns of a table, in table order. They're read from pg_attribute
+         (information_schema is slow on databases with many schemas) and kept until the columns of the table change.
+        """
+        columns = table_columns.get(schema_id, table_name)
+        if columns is None:
+            # Read before the catalog, the columns of a table that changed meanwhile aren't kept
+            version = table_versions.get(schema_id, table_name)
+            schema_name = 'schema-' + str(schema_id)
+            columns = [tuple(row) for row in db.engine.execute(
+                'SELECT attname, format_type(atttypid, NULL) FROM pg_attribute WHERE attrelid=to_regclass({}) '
+                'AND attnum > 0 AND NOT attisdropped ORDER BY attnum;'.format(
+                    _cv(_ci(schema_name) + '.' + _ci(table_name))))]
+            table_columns.set(schema_id, table_name, version, columns)
+        return columns
+
     def update_dataset_metadata(self, schema_id, new_name, new_desc):
         schema_name = "schema-" + str(schema_id)
         try:
@@ -1023,6 +2613,10 @@ class DataLoader:
             db.engine.execute(
                 'UPDATE history SET id_table={} WHERE id_dataset={} and id_table={};'.format(
                     *_cv(new_table_name, schema_name, old_table_name)))
+            for index_table in ['Search_Index', 'Full_Text_Index', 'Auto_Index']:
+                db.engine.execute(
+                    'UPDATE {} SET id_table={} WHERE id_dataset={} and id_table={};'.format(
+                        index_table, *_cv(new_table_name, schema_name, old_table_name)))
             if new_table_name != old_table_name:
                 db.engine.execute(
                     'ALTER TABLE {}.{} RENAME TO {};'.format(*_ci(schema_name, old_table_name, new_table_name)))
@@ -1030,16 +2624,32 @@ class DataLoader:
                 raw_table_new_name = "_raw_" + new_table_name
                 db.engine.execute(
                     'ALTER TABLE {}.{} RENAME TO {};'.format(*_ci(schema_name, raw_table_old_name, raw_table_new_name)))
+                for table_name in [old_table_name, new_table_name, raw_table_old_name, raw_table_new_name]:
+                    row_counts.invalidate(schema_id, table_name)
+                    table_versions.bump(schema_id, table_name)
+                    table_columns.invalidate(schema_id, table_name)
+                # Keep the search and sort indexes, they are named after the table
+                for column in self.get_column_names(schema_id, new_table_name):
+                    for index_name in [self._search_index_name, self._sort_index_name]:
+                        db.engine.execute('ALTER INDEX IF EXISTS {}.{} RENAME TO {};'.format(
+                            *_ci(schema_name, index_name(old_table_name, column), index_name(new_table_name, column))))
+                db.engine.execute('ALTER INDEX IF EXISTS {}.{} RENAME TO {};'.format(
+                    *_ci(schema_name, self._full_text_index_name(old_table_name),
+                         self._full_text_index_name(new_table_name))))
         except Exception as e:
             app.logger.error("[ERROR] Couldn't update table metadata for table " + old_table_name + ".")
             app.logger.exception(e)
             raise e
 
     # Data export handling
-    def export_table(self, filename, schema_id, tablename, separator=",", quote_char="\"", empty_char=""):
+    def export_table(self, filename, schema_id, tablename, separator=",", quote_char="\"", empty_char="",
+                     file_format='csv'):
         """
          This method return the path to a table exported as a CSV file (that could later be used as input again).
+         With file_format='parquet' the table is exported as a Parquet file instead, the CSV options are ignored then.
         """
+        if file_format == 'parquet':
+            return self.export_parquet(filename, schema_id, tablename)
 
         # Failsafe
         if separator == None or separator == "":
@@ -1073,6 +2683,68 @@ class DataLoader:
 
         return filename
 
+    def export_parquet(self, filename, schema_id, tablename, compression='snappy'):
+        """
+         This method exports a table (without its id column) as a compressed Parquet file and returns its path.
+         The rows are fetched with a server-side cursor and written as a row group per CSV_CHUNK_SIZE rows,
+         so memory usage doesn't depend on the size of the table.
+         Numeric columns are written as decimals when their precision is declared (and fits in 38 digits),
+         else as strings, so their values aren't rounded.
+        """
+        if pq is None:
+            raise RuntimeError("Tables can't be exported as Parquet files without pyarrow")
+
+        # Keyed on the Postgres types, timestamps with a time zone are written in UTC (and keep being timestamps with a
+        # time zone when imported)
+        arrow_types = {'integer': pa.int64(), 'smallint': pa.int64(), 'bigint': pa.int64(),
+                       'double precision': pa.float64(), 'real': pa.float64(), 'boolean': pa.bool_(),
+                       'date': pa.date32(), 'timestamp without time zone': pa.timestamp('us'),
+                       'timestamp with time zone': pa.timestamp('us', tz='UTC')}
+        decimal_types = dict()  # column name -> decimal type, for the numeric columns with a declared precision
+        for name, numeric_type in db.engine.execute(
+                'SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute WHERE attrelid=to_regclass({}) '
+                "AND attnum > 0 AND NOT attisdropped AND atttypid='numeric'::regtype;".format(
+                    _cv(_ci('schema-' + str(schema_id)) + '.' + _ci(tablename)))):
+            match = re.match(r'numeric\((\d+),(\d+)\)$', numeric_type)
+            if match and int(match.group(1)) <= 38:
+                decimal_types[name] = pa.decimal128(int(match.group(1)), int(match.group(2)))
+        columns = self._table_columns(schema_id, tablename)[1:]
+        schema = pa.schema([pa.field(name, decimal_types.get(name) or arrow_types.get(type, pa.string()))
+                            for name, type in columns])
+
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor(name='export_' + uuid.uuid4().hex)
+            cursor.itersize = CSV_CHUNK_SIZE
+            cursor.execute('SELECT {} FROM {}.{} ORDER BY id;'.format(
+                ', '.join(_ci(name) for name, _ in columns), *_ci('schema-' + str(schema_id), tablename)))
+            with pq.ParquetWriter(filename, schema, compression=compression) as writer:
+                while True:
+                    rows = cursor.fetchmany(CSV_CHUNK_SIZE)
+                    if not rows:
+                        break
+                    arrays = list()
+                    for c_ix, field in enumerate(schema):
+                        values = [row[c_ix] for row in rows]
+                        if field.type == pa.float64():
+                            values = [None if value is None else float(value) for value in values]
+                        elif field.type == pa.string():
+                            values = [None if value is None else str(value) for value in values]
+                        elif field.type == pa.timestamp('us', tz='UTC'):
+                            values = [None if value is None else value.astimezone(timezone.utc) for value in values]
+                        arrays.append(pa.array(values, type=field.type))
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            cursor.close()
+        except Exception as e:
+            app.logger.error("[ERROR] Couldn't export table '" + tablename + "' as a Parquet file")
+            app.logger.exception(e)
+            raise e
+        finally:
+            connection.rollback()
+            connection.close()
+
+        return filename
+
     # Statistics
     def get_numerical_statistic(self, schema_id, table_name, column, function):
 
@@ -1127,7 +2799,11 @@ class DataLoader:
             raise e
 
     def get_statistics_for_column(self, schema_id, table_name, column, numerical):
-        """calculate statistics of a column"""
+        """
+         calculate statistics of a column
+         The values are numbers or strings (decimals become floats, dates and the like strings), so they can be sent
+         as JSON.
+        """
 
         stats = list()
 
@@ -1139,6 +2815,11 @@ class DataLoader:
         stats.append(["Most common value", self.calculate_most_common_value(schema_id, table_name, column, )])
         stats.append(
             ["Amount of empty elements", self.calculate_amount_of_empty_elements(schema_id, table_name, column, )])
+        for stat in stats:
+            if isinstance(stat[1], Decimal):
+                stat[1] = float(stat[1])
+            elif stat[1] is not None and not isinstance(stat[1], (bool, int, float, str)):
+                stat[1] = str(stat[1])
         return stats
 
     def get_statistics_for_all_columns(self, schema_id, table_name, columns):
@@ -1167,6 +2848,9 @@ class DataLoader:
                 'DELETE FROM HISTORY WHERE ID_DATASET={0} AND ID_TABLE={1} AND ACTION_ID<>(SELECT MIN(ACTION_ID) FROM HISTORY WHERE ID_DATASET={0} AND ID_TABLE={1});'.format(
                     *_cv(schema_name, table_name)))
             transaction.commit()
+            row_counts.invalidate(schema_id, table_name)
+            table_versions.bump(schema_id, table_name)
+            table_columns.invalidate(schema_id, table_name)
             create_serial_sequence(schema_name, table_name)
         except Exception as e:
             transaction.rollback()
@@ -1241,6 +2925,9 @@ class DataLoader:
                 "DELETE FROM HISTORY WHERE ID_DATASET={} AND ID_TABLE={} AND DATE>'{}';".format(
                     *_cv(schema_name, table_name), timestamp))
             transaction.commit()
+            row_counts.invalidate(schema_id, table_name)
+            table_versions.bump(schema_id, table_name)
+            table_columns.invalidate(schema_id, table_name)
             create_serial_sequence(schema_name, table_name)
         except Exception as e:
             transaction.rollback()
@@ -1288,6 +2975,351 @@ class DataLoader:
             raise e
 
 
+class ResumableUpload:
+    """
+     A file that is uploaded in numbered chunks, each with the SHA-256 checksum of its data.
+     Chunks are appended to a staging file in order, a chunk that was already received can be sent again
+     (e.g. when the client didn't get the response), so an interrupted upload can resume at next_chunk.
+    """
+
+    def __init__(self, id, schema_id, filename, path, size, chunk_size=UPLOAD_CHUNK_SIZE, owner=None,
+                 table_name=None, table_description='Default description', type_deduction=False):
+        self.id = id
+        self.schema_id = schema_id
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.chunk_size = chunk_size
+        self.owner = owner
+        self.table_name = table_name
+        self.table_description = table_description
+        self.type_deduction = type_deduction
+        self.checksums = list()
+        self.received_bytes = 0
+        self.complete = False
+        self.aborted = False
+        self.job = None
+        self.last_activity = datetime.now()
+        self.condition = threading.Condition()
+        open(path, 'wb').close()
+
+    @property
+    def next_chunk(self):
+        return len(self.checksums)
+
+    def add_chunk(self, index, data, checksum):
+        """ Appends a chunk to the staging file, raises a ValueError if it's out of order or its checksum is wrong """
+        checksum = (checksum or '').lower()
+        with self.condition:
+            if self.aborted:
+                raise ValueError('Upload has been aborted')
+            if index < self.next_chunk:
+                if self.checksums[index] != checksum:
+                    raise ValueError('Chunk {} was already received with another checksum'.format(index))
+                return
+            if index > self.next_chunk:
+                raise ValueError('Expected chunk {}, got chunk {}'.format(self.next_chunk, index))
+            if self.complete:
+                raise ValueError('Upload is already complete')
+            if hashlib.sha256(data).hexdigest() != checksum:
+                raise ValueError('Checksum of chunk {} does not match'.format(index))
+            if self.received_bytes + len(data) > self.size or \
+                    (len(data) != self.chunk_size and self.received_bytes + len(data) != self.size):
+                raise ValueError('Chunk {} has a wrong size'.format(index))
+
+            with open(self.path, 'ab') as file:
+                file.write(data)
+            self.checksums.append(checksum)
+            self.received_bytes += len(data)
+            self.last_activity = datetime.now()
+            self.condition.notify_all()
+
+    def finish(self):
+        with self.condition:
+            if self.aborted:
+                raise ValueError('Upload has been aborted')
+            if self.received_bytes != self.size:
+                raise ValueError('Received {} of {} bytes'.format(self.received_bytes, self.size))
+            self.complete = True
+            self.condition.notify_all()
+
+    def abort(self):
+        with self.condition:
+            self.aborted = True
+            self.condition.notify_all()
+
+    def reader(self):
+        """ Returns a (buffered) file object that reads the staging file while chunks are still arriving """
+        return io.BufferedReader(UploadReader(self))
+
+    def to_dict(self):
+        return {'id': self.id, 'dataset': self.schema_id, 'filename': self.filename, 'size': self.size,
+                'chunk_size': self.chunk_size, 'next_chunk': self.next_chunk, 'received_bytes': self.received_bytes,
+                'complete': self.complete, 'aborted': self.aborted, 'job': self.job.id if self.job else None}
+
+
+class UploadReader(io.RawIOBase):
+    """
+     Reads the staging file of a ResumableUpload, waiting for the next chunk at the end of the received data
+     until the upload is complete. Fails if the upload is aborted or no chunk arrives in UPLOAD_TIMEOUT_SECONDS.
+    """
+
+    def __init__(self, upload):
+        self.upload = upload
+        self.file = open(upload.path, 'rb')
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        upload = self.upload
+        with upload.condition:
+            while self.position >= upload.received_bytes and not upload.complete and not upload.aborted:
+                if not upload.condition.wait(timeout=UPLOAD_TIMEOUT_SECONDS):
+                    raise IOError("Upload '" + upload.id + "' timed out")
+            if upload.aborted:
+                raise IOError("Upload '" + upload.id + "' has been aborted")
+            available = upload.received_bytes - self.position
+        if available <= 0:
+            return 0
+        view = memoryview(buffer)[:available]
+        read = self.file.readinto(view)
+        self.position += read
+        return read
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class IngestionJob:
+    def __init__(self, id, schema_id, filename, owner=None, total_bytes=0):
+        self.id = id
+        self.schema_id = schema_id
+        self.filename = filename
+        self.owner = owner
+        self.total_bytes = total_bytes
+        self.status = 'queued'
+        self.rows = 0
+        self.bytes = 0
+        self.error = None
+        self.created = datetime.now()
+        self.started = None
+        self.finished = None
+        self.future = None
+        # File object whose position counts as the bytes processed, for compressed uploads
+        self.source = None
+        self._lock = threading.Lock()
+
+    def update(self, rows=0, bytes=0):
+        """ Progress callback for the process_* methods of DataLoader, the amounts are added to the totals """
+        with self._lock:
+            self.rows += rows
+            self.bytes = _file_position(self.source) if self.source is not None else self.bytes + bytes
+
+    def start(self):
+        self.status = 'running'
+        self.started = datetime.now()
+
+    def finish(self, error=None):
+        self.status = 'failed' if error is not None else 'done'
+        self.error = error
+        self.finished = datetime.now()
+
+    def eta(self):
+        """ Estimated amount of seconds left, based on the throughput (in bytes) so far """
+        if self.status != 'running' or not self.bytes or not self.total_bytes:
+            return None
+        elapsed = (datetime.now() - self.started).total_seconds()
+        return max(self.total_bytes - self.bytes, 0) * elapsed / self.bytes
+
+    def to_dict(self):
+        with self._lock:
+            rows, processed = self.rows, self.bytes
+        return {'id': self.id, 'dataset': self.schema_id, 'filename': self.filename, 'status': self.status,
+                'rows': rows, 'bytes': processed, 'total_bytes': self.total_bytes,
+                'progress': min(processed / self.total_bytes, 1.0) if self.total_bytes else None,
+                'eta': self.eta(), 'error': self.error,
+                'created': self.created.isoformat(),
+                'started': self.started.isoformat() if self.started else None,
+                'finished': self.finished.isoformat() if self.finished else None}
+
+
+class IngestionJobManager:
+    """
+     Runs uploaded files through DataLoader on a pool of background workers (INGESTION_WORKERS),
+     so an upload only has to store the file and can return the id of its job right away.
+     Resumable uploads that are imported while their chunks arrive run on a pool of their own (STREAMING_WORKERS),
+     so clients that stop sending chunks can't hold up the other imports.
+     Finished jobs are kept for JOB_RETENTION_SECONDS so their result can still be looked up.
+    """
+
+    def __init__(self, data_loader, workers=INGESTION_WORKERS, streaming_workers=STREAMING_WORKERS):
+        self.data_loader = data_loader
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.streaming_executor = ThreadPoolExecutor(max_workers=streaming_workers)
+        self.jobs = dict()
+        self.uploads = dict()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._check_uploads, daemon=True).start()
+
+    def submit(self, path, schema_id, table_name=None, table_description='Default description', type_deduction=False,
+               owner=None, filename=None, upload=None):
+        """
+         Queues the import of an uploaded file (CSV, JSON Lines, ZIP, Parquet or SQL dump, decided on its extension)
+         and returns its job.
+         CSV, JSON Lines files and dumps can be compressed (gzip, bzip2 or xz), they're decompressed while being imported.
+         If upload (a ResumableUpload) is given, the file is read while its chunks are still arriving.
+         The file is removed once it has been processed.
+        """
+        filename = filename or os.path.basename(path)
+        if upload is not None:
+            total_bytes = upload.size
+        elif path.lower().endswith('.zip'):
+            with ZipFile(path) as archive:
+                total_bytes = sum(m.file_size for m in archive.infolist() if m.filename.endswith('.csv'))
+        else:
+            total_bytes = os.path.getsize(path)
+
+        job = IngestionJob(uuid.uuid4().hex, schema_id, filename, owner=owner, total_bytes=total_bytes)
+        with self._lock:
+            self._remove_old_jobs()
+            self.jobs[job.id] = job
+        executor = self.executor if upload is None else self.streaming_executor
+        job.future = executor.submit(self.run, job, path, table_name, table_description, type_deduction, upload)
+        return job
+
+    def run(self, job, path, table_name, table_description, type_deduction, upload=None):
+        job.start()
+        try:
+            name, compression = _split_compression(path)
+            extension = name.rsplit('.', 1)[-1].lower()
+            if extension == 'zip':
+                self.data_loader.process_zip(path, job.schema_id, type_deduction=type_deduction, progress=job.update)
+            elif extension == 'parquet':
+                with self.data_loader.load_lock(job.schema_id, table_name):
+                    append = self.data_loader.table_exists(table_name, job.schema_id)
+                    self.data_loader.process_parquet(path, job.schema_id, table_name,
+                                                     table_description=table_description, append=append,
+                                                     progress=job.update)
+            else:
+                # Jobs loading into the same table run one after the other, the first one creates it and the others append
+                load_lock = self.data_loader.load_lock(job.schema_id, table_name) if extension in ['csv', 'jsonl'] \
+                    else contextlib.ExitStack()
+                with (upload.reader() if upload is not None else open(path, 'rb')) as raw_file, load_lock:
+                    file = raw_file
+                    if compression:
+                        # The progress is measured on the compressed upload, the size of the decompressed data is unknown
+                        job.source = raw_file
+                        file = _decompressors[compression](raw_file, 'rb')
+                    if extension == 'csv':
+                        append = self.data_loader.table_exists(table_name, job.schema_id)
+                        self.data_loader.process_csv(file, job.schema_id, table_name,
+                                                     table_description=table_description, append=append,
+                                                     type_deduction=type_deduction, progress=job.update)
+                    elif extension == 'jsonl':
+                        append = self.data_loader.table_exists(table_name, job.schema_id)
+                        self.data_loader.process_jsonl(file, job.schema_id, table_name,
+                                                       table_description=table_description, append=append,
+                                                       progress=job.update)
+                    else:
+                        self.data_loader.process_dump(file, job.schema_id, table_name=table_name,
+                                                      table_description=table_description, progress=job.update)
+            job.finish()
+        except Exception as e:
+            app.logger.error("[ERROR] Import job '" + job.id + "' for file '" + job.filename + "' failed")
+            app.logger.exception(e)
+            job.finish(error=str(e))
+            if upload is not None:
+                # Refuse the remaining chunks of an upload that can't be imported anymore
+                upload.abort()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def create_upload(self, schema_id, filename, size, chunk_size=None, owner=None, table_name=None,
+                      table_description='Default description', type_deduction=False):
+        """
+         Starts a resumable upload of a file into UPLOAD_FOLDER. CSV, JSON Lines files and dumps are streamed, their
+         import job starts right away and reads the chunks as they arrive. ZIP archives & Parquet files need the
+         complete file, their job starts once the upload is finished.
+        """
+        if not os.path.exists(UPLOAD_FOLDER):
+            os.makedirs(UPLOAD_FOLDER)
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(UPLOAD_FOLDER, upload_id + '-' + filename)
+        upload = ResumableUpload(upload_id, schema_id, filename, path, size, chunk_size=chunk_size or UPLOAD_CHUNK_SIZE,
+                                 owner=owner, table_name=table_name, table_description=table_description,
+                                 type_deduction=type_deduction)
+        with self._lock:
+            self._remove_stale_uploads()
+            self.uploads[upload_id] = upload
+
+        if _split_compression(filename)[0].rsplit('.', 1)[-1].lower() not in ['zip', 'parquet']:
+            upload.job = self.submit(path, schema_id, table_name=table_name, table_description=table_description,
+                                     type_deduction=type_deduction, owner=owner, filename=filename, upload=upload)
+        return upload
+
+    def get_upload(self, upload_id):
+        with self._lock:
+            return self.uploads.get(upload_id)
+
+    def finish_upload(self, upload):
+        """ Marks an upload as complete and returns its import job, starting it if it's not streaming yet """
+        upload.finish()
+        if upload.job is None:
+            upload.job = self.submit(upload.path, upload.schema_id, table_name=upload.table_name,
+                                     table_description=upload.table_description,
+                                     type_deduction=upload.type_deduction, owner=upload.owner,
+                                     filename=upload.filename)
+        with self._lock:
+            self.uploads.pop(upload.id, None)
+        return upload.job
+
+    def abort_upload(self, upload):
+        upload.abort()
+        with self._lock:
+            self.uploads.pop(upload.id, None)
+        if upload.job is None and os.path.exists(upload.path):
+            os.remove(upload.path)
+
+    def _check_uploads(self):
+        """ Aborts stale uploads every UPLOAD_CHECK_SECONDS, also when no other uploads are made """
+        while True:
+            time.sleep(UPLOAD_CHECK_SECONDS)
+            with self._lock:
+                self._remove_stale_uploads()
+
+    def _remove_stale_uploads(self):
+        now = datetime.now()
+        for upload in list(self.uploads.values()):
+            if (now - upload.last_activity).total_seconds() > UPLOAD_TIMEOUT_SECONDS:
+                del self.uploads[upload.id]
+                upload.abort()
+                if upload.job is None and os.path.exists(upload.path):
+                    os.remove(upload.path)
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def get_jobs(self, schema_id):
+        """ Returns the (unfinished and recently finished) jobs of a dataset, oldest first """
+        with self._lock:
+            jobs = [job for job in self.jobs.values() if job.schema_id == schema_id]
+        return sorted(jobs, key=lambda job: job.created)
+
+    def _remove_old_jobs(self):
+        now = datetime.now()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished is not None and (now - job.finished).total_seconds() > JOB_RETENTION_SECONDS:
+                del self.jobs[job_id]
+
+
 class TableJoinPair:
     def __init__(self, table1_name, table2_name, table1_column, table2_column, relation_operator):
         self.table1_name = table1_name
@@ -1474,6 +3506,8 @@ class TableJoiner:
         schema_name = "schema-" + str(dataset_id)
 
         column_names = self.data_loader.get_column_names(dataset_id, temp_table_name)
+        # The temporary table is dropped (and made again by the next join), its columns aren't kept
+        table_columns.invalidate(dataset_id, temp_table_name)
 
         new_table_query = 'CREATE TABLE {}.{} AS SELECT \"id\"'.format(*_ci(schema_name, new_table_name))
 
@@ -1559,6 +3593,7 @@ class TableJoiner:
             query = 'SELECT * INTO {0}.{1} FROM {0}.{2};'.format(*_ci(schema_name, '_raw_' + table_name, table_name))
             connection.execute(query)
             transaction.commit()
+            table_columns.invalidate(dataset_id, '_raw_' + table_name)
         except Exception as e:
             transaction.rollback()
             app.logger.error("[ERROR] Failed to create raw data for table '" + table_name + "'")
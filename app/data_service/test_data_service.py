@@ -1,7 +1,20 @@
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import tempfile
+import time
 import unittest
-from app import user_data_access, data_loader, database as db
+from datetime import datetime, timedelta
+from zipfile import ZipFile
+from app import user_data_access, data_loader, job_manager, database as db, AUTO_INDEX_THRESHOLD, \
+    AUTO_INDEX_MIN_ROWS, AUTO_INDEX_BUDGET, UPLOAD_TIMEOUT_SECONDS
 from app.user_service.models import User
-from app.data_service.models import Dataset, Column, Table, _cv, _ci
+from app.data_service.models import Dataset, Column, Table, PageCache, IngestionJobManager, _cv, _ci
+from app.history.models import History, row_counts, table_columns, table_versions
+
+history = History()
 
 username = "test_username"
 password = "test_pass"
@@ -198,6 +211,836 @@ class TestDataService(unittest.TestCase):
             data_loader.delete_table(table_name, schema_id)
             data_loader.delete_dataset(schema_id)
 
+    def test_process_csv(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        csv_file = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        csv_file.write('name,amount\n"Smith, John",1\nDoe,\n')
+        csv_file.close()
+        try:
+            data_loader.create_dataset(schema_name, username)
+            self.assertRaises(ValueError, data_loader.process_csv, csv_file.name, schema_id, table_name, append=True)
+            data_loader.process_csv(csv_file.name, schema_id, table_name)
+            self.assertRaises(ValueError, data_loader.process_csv, csv_file.name, schema_id, table_name)
+            # The counts of both tables are counted again after appending
+            self.assertEqual(2, data_loader.get_table(schema_id, '_raw_' + table_name, limit=1).total_size)
+            data_loader.process_csv(csv_file.name, schema_id, table_name, append=True)
+            self.assertEqual(4, data_loader.get_table(schema_id, '_raw_' + table_name, limit=1).total_size)
+            table = data_loader.get_table(schema_id, table_name)
+            raw_table = data_loader.get_table(schema_id, '_raw_' + table_name)
+            self.assertEqual(['id', 'name', 'amount'], [column.name for column in table.columns])
+            self.assertEqual([[1, 'Smith, John', '1'], [2, 'Doe', None], [3, 'Smith, John', '1'],
+                              [4, 'Doe', None]], sorted(table.rows))
+            self.assertEqual(sorted(table.rows), sorted(raw_table.rows))
+        finally:
+            os.remove(csv_file.name)
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_process_csv_type_deduction(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        csv_file = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        csv_file.write('name,amount,price,date\ncoco,1,2.5,2018-04-01\npumba,2,3.5,2018-04-02\n')
+        csv_file.close()
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.process_csv(csv_file.name, schema_id, table_name, type_deduction=True)
+            data_loader.process_csv(csv_file.name, schema_id, table_name, append=True, type_deduction=True)
+            table = data_loader.get_table(schema_id, table_name)
+            self.assertEqual(['integer', 'text', 'integer', 'double', 'date'],
+                             [column.type for column in table.columns])
+            self.assertEqual([1, 2, 3, 4], sorted(row[0] for row in table.rows))
+        finally:
+            os.remove(csv_file.name)
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_process_csv_chunked(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        csv_file = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        csv_file.write('name,amount,date\ncoco,1,2018-04-01\npumba,2,2018-04-02\nnala,,2018-04-03\nsimba,4,\n')
+        csv_file.close()
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.process_csv(csv_file.name, schema_id, table_name, type_deduction=True, chunk_size=2)
+            table = data_loader.get_table(schema_id, table_name, ordering=('id', 'asc'))
+            self.assertEqual(['integer', 'text', 'integer', 'date'], [column.type for column in table.columns])
+            self.assertEqual([1, 2, None, 4], [row[2] for row in table.rows])
+            self.assertIsNone(table.rows[3][3])
+        finally:
+            os.remove(csv_file.name)
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_process_csv_type_fallback(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        csv_file = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        csv_file.write('amount,price,flag,date\n1,1,yes,2018-04-01\n2,2,no,2018-04-02\n'
+                       '3,2.5,no,2018-04-03 10:30\nabc,3,maybe,2018-04-04\n')
+        csv_file.close()
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.process_csv(csv_file.name, schema_id, table_name, type_deduction=True, chunk_size=2)
+            table = data_loader.get_table(schema_id, table_name, ordering=('id', 'asc'))
+            raw_table = data_loader.get_table(schema_id, '_raw_' + table_name)
+            self.assertEqual(['integer', 'text', 'double', 'text', 'timestamp'],
+                             [column.type for column in table.columns])
+            self.assertEqual([column.type for column in table.columns], [column.type for column in raw_table.columns])
+            self.assertEqual(['1', '2', '3', 'abc'], [row[1] for row in table.rows])
+            self.assertEqual([1.0, 2.0, 2.5, 3.0], [row[2] for row in table.rows])
+        finally:
+            os.remove(csv_file.name)
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_process_zip(self):
+        schema_name = 'test-schema'
+        schema_id = 0
+        zip_file = tempfile.NamedTemporaryFile(suffix='.zip', delete=False)
+        zip_file.close()
+        with ZipFile(zip_file.name, 'w') as archive:
+            archive.writestr('lions.csv', 'name,legs\nsimba,4\n')
+            archive.writestr('birds.csv', 'name,legs\nzazu,2\n')
+            archive.writestr('more/lions.csv', 'name,legs\nnala,4\nmufasa,4\n')
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.process_zip(zip_file.name, schema_id, type_deduction=True)
+            lions = data_loader.get_table(schema_id, 'lions', ordering=('id', 'asc'))
+            birds = data_loader.get_table(schema_id, 'birds')
+            self.assertEqual([[1, 'simba', 4], [2, 'nala', 4], [3, 'mufasa', 4]], lions.rows)
+            self.assertEqual([[1, 'zazu', 2]], birds.rows)
+        finally:
+            os.remove(zip_file.name)
+            data_loader.delete_table('lions', schema_id)
+            data_loader.delete_table('birds', schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_process_dump(self):
+        schema_name = 'test-schema'
+        schema_id = 0
+        dump_file = tempfile.NamedTemporaryFile('w', suffix='.sql', delete=False)
+        dump_file.write("-- Dumped; with comments\n"
+                        "CREATE TABLE public.lions (name varchar(255), quote text);\n"
+                        "CREATE FUNCTION public.roar() RETURNS text AS $$ SELECT 'roar'; $$ LANGUAGE sql;\n"
+                        "INSERT INTO public.lions (name, quote) VALUES ('simba', 'hakuna, matata; (no worries)');\n"
+                        "INSERT INTO \"lions\" (\"name\", \"quote\") VALUES ('nala', 'it''s me'), ('scar', NULL), "
+                        "('mufasa', ''::text);\n"
+                        "COPY public.birds (name) FROM stdin;\nzazu's; (\n\\.\n"
+                        "INSERT INTO birds VALUES (E'za\\'zu', 2, ARRAY[1,2]);\n")
+        dump_file.close()
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.process_dump(dump_file.name, schema_id, None)
+            lions = data_loader.get_table(schema_id, 'lions', ordering=('id', 'asc'))
+            birds = data_loader.get_table(schema_id, 'birds')
+            self.assertEqual([[1, 'simba', 'hakuna, matata; (no worries)'], [2, 'nala', "it's me"], [3, 'scar', None],
+                              [4, 'mufasa', '']], lions.rows)
+            self.assertEqual([[1, "za'zu", '2', 'ARRAY[1,2]']], birds.rows)
+            self.assertEqual(['id', 'col1', 'col2', 'col3'], data_loader.get_column_names(schema_id, 'birds'))
+
+            # Loading the dump again appends to the tables, the count of the raw table as well
+            self.assertEqual(4, data_loader.get_table(schema_id, '_raw_lions', limit=1).total_size)
+            data_loader.process_dump(dump_file.name, schema_id, None)
+            self.assertEqual(8, data_loader.get_table(schema_id, '_raw_lions', limit=1).total_size)
+        finally:
+            os.remove(dump_file.name)
+            data_loader.delete_table('lions', schema_id)
+            data_loader.delete_table('birds', schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_process_jsonl(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        jsonl_file = tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False)
+        jsonl_file.write('{"name": "Smith", "age": 30, "address": {"city": "Antwerp"}, "tags": ["a", "b"]}\n'
+                         '{"name": "Doe", "age": null, "address": {"city": "Ghent"}, "tags": []}\n'
+                         'not json\n'
+                         '\n'
+                         '{"name": "Roe", "age": 41, "address": {"city": "Brussels", "zip": 1000}}\n')
+        jsonl_file.close()
+        try:
+            data_loader.create_dataset(schema_name, username)
+            skipped = data_loader.process_jsonl(jsonl_file.name, schema_id, table_name, chunk_size=2)
+            table = data_loader.get_table(schema_id, table_name)
+            self.assertEqual(1, skipped)
+            self.assertEqual(['id', 'name', 'age', 'address.city', 'tags', 'address.zip'],
+                             [column.name for column in table.columns])
+            self.assertEqual(['integer', 'text', 'integer', 'text', 'text', 'text'],
+                             [column.type for column in data_loader.get_column_names_and_types(schema_id, table_name)])
+            self.assertEqual([[1, 'Smith', 30, 'Antwerp', '["a", "b"]', None], [2, 'Doe', None, 'Ghent', '[]', None],
+                              [3, 'Roe', 41, 'Brussels', None, '1000']], sorted(table.rows))
+            self.assertEqual(sorted(table.rows), sorted(data_loader.get_table(schema_id, '_raw_' + table_name).rows))
+        finally:
+            os.remove(jsonl_file.name)
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_get_table_cursor(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.create_table(table_name, schema_id, ['amount'], column_types=['integer'])
+            for amount in ['3', '', '1', '3', '', '2', '1']:
+                db.engine.execute('INSERT INTO {}.{} (amount) VALUES ({});'.format(
+                    *_ci('schema-' + str(schema_id), table_name), amount or 'NULL'))
+
+            for ordering in [('amount', 'asc'), ('amount', 'desc'), ('id', 'desc')]:
+                expected = data_loader.get_table(schema_id, table_name, ordering=ordering).rows
+                pages = [data_loader.get_table(schema_id, table_name, limit=2, ordering=ordering)]
+                while pages[-1].next_cursor:
+                    pages.append(data_loader.get_table(schema_id, table_name, limit=2, ordering=ordering,
+                                                       cursor=pages[-1].next_cursor))
+                self.assertEqual(expected, [row for page in pages for row in page.rows])
+                self.assertEqual([2, 2, 2, 1], [len(page.rows) for page in pages])
+
+                # And back again
+                page = pages[-1]
+                for previous in reversed(pages[:-1]):
+                    page = data_loader.get_table(schema_id, table_name, limit=2, ordering=ordering,
+                                                 cursor=page.prev_cursor)
+                    self.assertEqual(previous.rows, page.rows)
+
+            self.assertEqual(pages[1].rows, data_loader.get_table(schema_id, table_name, offset=2, limit=2,
+                                                                  ordering=('id', 'desc')).rows)
+            self.assertRaises(ValueError, data_loader.get_table, schema_id, table_name, limit=2,
+                              ordering=('amount', 'asc'), cursor=pages[1].next_cursor)
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_get_table_stream(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.create_table(table_name, schema_id, ['name'], column_types=['text'])
+            db.engine.execute("INSERT INTO {}.{} (name) SELECT '50%% ' || i FROM generate_series(1, 5) i;".format(
+                *_ci('schema-' + str(schema_id), table_name)))
+
+            for kwargs in [dict(), dict(limit=2, offset=2), dict(limit=2, search='%'), dict(search='nothing')]:
+                table = data_loader.get_table(schema_id, table_name, **kwargs)
+                streamed = data_loader.get_table(schema_id, table_name, stream=True, **kwargs)
+                self.assertEqual(table.filtered_size, streamed.filtered_size)
+                # The cursors are only known after the last row was read
+                self.assertEqual(table.rows, list(streamed.rows))
+                self.assertEqual((table.next_cursor, table.prev_cursor), (streamed.next_cursor, streamed.prev_cursor))
+
+            page = data_loader.get_table(schema_id, table_name, limit=2, stream=True)
+            self.assertEqual([1, 2], [row[0] for row in page.rows])
+            page = data_loader.get_table(schema_id, table_name, limit=2, cursor=page.next_cursor, stream=True)
+            self.assertEqual([3, 4], [row[0] for row in page.rows])
+            page = data_loader.get_table(schema_id, table_name, limit=2, cursor=page.prev_cursor, stream=True)
+            self.assertEqual([1, 2], [row[0] for row in page.rows])
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_column_statistics(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.create_table(table_name, schema_id, ['amount', 'added'], column_types=['integer', 'date'])
+            for amount, added in [('1', '2018-01-01'), ('2', '2018-01-01'), ('3', '2018-03-01'), ('3', '2018-02-01')]:
+                data_loader.insert_row(table_name, schema_id, ['amount', 'added'], {'amount': amount, 'added': added})
+            statistics = data_loader.get_statistics_for_column(schema_id, table_name, 'amount', True)
+            self.assertEqual([['Average', 2.25], ['Minimum', 1], ['Maximum', 3], ['Most common value', 3]],
+                             statistics[:4])
+            # The statistics are sent as JSON
+            json.dumps(statistics)
+            statistics = data_loader.get_statistics_for_column(schema_id, table_name, 'added', False)
+            self.assertEqual(['Most common value', '2018-01-01'], statistics[0])
+            json.dumps(statistics)
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_get_table_outline(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.create_table(table_name, schema_id, ['name'], column_types=['text'])
+            data_loader.insert_row(table_name, schema_id, ['name'], {'name': 'Smith'})
+            table = data_loader.get_table_outline(schema_id, table_name)
+            self.assertEqual(['id', 'name'], [column.name for column in table.columns])
+            self.assertEqual(([], schema_id), (table.rows, table.dataset))
+            with self.assertRaises(ValueError):
+                data_loader.get_table_outline(schema_id, 'missing-table')
+
+            self.assertEqual(2, history.count_actions(schema_id, table_name))
+            self.assertEqual(1, history.count_actions(schema_id, table_name, search='row'))
+            self.assertEqual(0, history.count_actions(schema_id, table_name, search='Doe'))
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_get_table_columns_and_filters(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.create_table(table_name, schema_id, ['name', 'amount'], column_types=['text', 'integer'])
+            db.engine.execute("INSERT INTO {}.{} (name, amount) SELECT CASE WHEN i %% 3 > 0 THEN '50%% ' || i END, i "
+                              "FROM generate_series(1, 10) i;".format(*_ci('schema-' + str(schema_id), table_name)))
+
+            # Id and the ordering column are read for the cursors
+            table = data_loader.get_table(schema_id, table_name, limit=2, ordering=('amount', 'desc'),
+                                          columns=['name'], filters=[('amount', 'between', ['2', 8]),
+                                                                     ('name', 'not null', None)])
+            self.assertEqual(['id', 'amount', 'name'], [column.name for column in table.columns])
+            self.assertEqual([[8, 8, '50% 8'], [7, 7, '50% 7']], table.rows)
+            self.assertEqual(5, table.filtered_size)
+            page = data_loader.get_table(schema_id, table_name, limit=2, ordering=('amount', 'desc'),
+                                         cursor=table.next_cursor, columns=['name'],
+                                         filters=[('amount', 'between', ['2', 8]), ('name', 'not null', None)])
+            self.assertEqual([5, 4], [row[0] for row in page.rows])
+
+            table = data_loader.get_table(schema_id, table_name, search='%', filters=[('amount', 'in', [1, 2, 3])])
+            self.assertEqual([1, 2], [row[0] for row in table.rows])
+            table = data_loader.get_table(schema_id, table_name, filters=[('name', 'null', None), ('amount', '>', 5)])
+            self.assertEqual([6, 9], [row[0] for row in table.rows])
+
+            for filters in [[('amount', '=', 'abc')], [('missing', '=', 1)], [('amount', 'like', 1)],
+                            [('amount', 'in', [])], [('amount', 'between', [1])], [('amount', '=', None)]]:
+                with self.assertRaises(ValueError):
+                    data_loader.get_table(schema_id, table_name, filters=filters)
+            with self.assertRaises(ValueError):
+                data_loader.get_table(schema_id, table_name, columns=['missing'])
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_row_counts(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.create_table(table_name, schema_id, ['name'])
+            for name in ['Smith', 'Doe', 'Roe']:
+                data_loader.insert_row(table_name, schema_id, ['name'], {'name': name})
+            table = data_loader.get_table(schema_id, table_name, limit=1, search='oe')
+            self.assertEqual((3, 2), (table.total_size, table.filtered_size))
+
+            # Counts are kept up to date by actions on the table, not counted again
+            db.engine.execute("INSERT INTO {}.{} (name) VALUES ('Poe');".format(
+                *_ci('schema-' + str(schema_id), table_name)))
+            self.assertEqual(3, data_loader.count_rows(schema_id, table_name))
+            data_loader.insert_row(table_name, schema_id, ['name'], {'name': 'Moe'})
+            data_loader.delete_row(schema_id, table_name, [1])
+            table = data_loader.get_table(schema_id, table_name, limit=1, search='oe')
+            # The total was adjusted, counts of searches are dropped
+            self.assertEqual((3, 4), (table.total_size, table.filtered_size))
+            data_loader.delete_column(schema_id, table_name, 'name')
+            self.assertEqual(4, data_loader.get_table(schema_id, table_name, limit=1).total_size)
+
+            # A count made while the table changed isn't kept
+            version = table_versions.get(schema_id, table_name)
+            row_counts.invalidate(schema_id, table_name)
+            row_counts.set(schema_id, table_name, version, 3)
+            self.assertIsNone(row_counts.get(schema_id, table_name))
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_column_cache(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.create_table(table_name, schema_id, ['name', 'amount'], column_types=['text', 'integer'])
+            data_loader.insert_row(table_name, schema_id, ['name', 'amount'], {'name': 'Smith', 'amount': '1'})
+            self.assertEqual(['id', 'name', 'amount'], data_loader.get_column_names(schema_id, table_name))
+            self.assertEqual(['integer', 'text', 'integer'],
+                             [column.type for column in data_loader.get_column_names_and_types(schema_id, table_name)])
+
+            # Columns are kept, only the paths changing them drop them
+            db.engine.execute('ALTER TABLE {}.{} ADD COLUMN unseen text;'.format(
+                *_ci('schema-' + str(schema_id), table_name)))
+            self.assertEqual(['id', 'name', 'amount'], data_loader.get_column_names(schema_id, table_name))
+            data_loader.insert_column(schema_id, table_name, 'note', 'varchar(255)', enable_history=False)
+            self.assertEqual(['id', 'name', 'amount', 'unseen', 'note'],
+                             data_loader.get_column_names(schema_id, table_name))
+            data_loader.rename_column(schema_id, table_name, 'note', 'remark')
+            data_loader.update_column_type(schema_id, table_name, 'amount', 'double precision')
+            data_loader.delete_column(schema_id, table_name, 'unseen')
+            self.assertEqual([('id', 'integer'), ('name', 'text'), ('amount', 'double'), ('remark', 'text')],
+                             [(column.name, column.type) for column in
+                              data_loader.get_column_names_and_types(schema_id, table_name)])
+
+            # Undoing an action (adding the deleted column back) drops them as well
+            action_id = db.engine.execute('SELECT MAX(action_id) FROM history WHERE id_dataset={};'.format(
+                _cv('schema-' + str(schema_id)))).first()[0]
+            history.undo_action(schema_id, table_name, action_id)
+            self.assertEqual(['id', 'name', 'amount', 'remark', 'unseen'],
+                             data_loader.get_column_names(schema_id, table_name))
+
+            # Columns read while the table changed aren't kept
+            version = table_versions.get(schema_id, table_name)
+            table_columns.invalidate(schema_id, table_name)
+            table_columns.set(schema_id, table_name, version, [('id', 'integer')])
+            self.assertIsNone(table_columns.get(schema_id, table_name))
+
+            data_loader.delete_table(table_name, schema_id)
+            self.assertEqual([], data_loader.get_column_names(schema_id, table_name))
+            data_loader.create_table(table_name, schema_id, ['other'])
+            self.assertEqual(['id', 'other'], data_loader.get_column_names(schema_id, table_name))
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_table_versions(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.create_table(table_name, schema_id, ['name'])
+            versions = [table_versions.get(schema_id, table_name)]
+            data_loader.get_table(schema_id, table_name)
+            self.assertEqual(versions[-1], table_versions.get(schema_id, table_name))
+
+            # Every change to the table changes its version
+            data_loader.insert_row(table_name, schema_id, ['name'], {'name': 'Smith'}, add_history=False)
+            versions.append(table_versions.get(schema_id, table_name))
+            data_loader.insert_column(schema_id, table_name, 'note', 'text', enable_history=False)
+            versions.append(table_versions.get(schema_id, table_name))
+            data_loader.delete_row(schema_id, table_name, [1])
+            versions.append(table_versions.get(schema_id, table_name))
+            data_loader.delete_table(table_name, schema_id)
+            versions.append(table_versions.get(schema_id, table_name))
+            self.assertEqual(len(versions), len(set(versions)))
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_page_cache(self):
+        cache = PageCache(size=10, max_page=6)
+        cache.set('a', {}, 'aaaa')
+        cache.set('b', {}, 'bbbb')
+        self.assertEqual(({}, 'aaaa'), cache.get('a'))
+        # The least recently used page makes room
+        cache.set('c', {}, 'cccc')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('aaaa', cache.get('a')[1])
+        cache.set('d', {}, 'ddddddd')
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(8, cache.used)
+
+    def test_search_index(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.create_table(table_name, schema_id, ['name', 'amount'], column_types=['text', 'integer'])
+            db.engine.execute("INSERT INTO {}.{} (name, amount) VALUES ('50%% off', 50), ('it''s', 1), ('a_b', 2);"
+                              .format(*_ci('schema-' + str(schema_id), table_name)))
+            for search, names in [('%', ['50% off']), ("'", ["it's"]), ('_', ['a_b']), ('5', ['50% off'])]:
+                self.assertEqual(names, [row[1] for row in data_loader.get_table(schema_id, table_name,
+                                                                                 search=search).rows])
+            # The index is only checked again once the table changed
+            key = ('search', 'schema-' + str(schema_id), table_name)
+            self.assertEqual(table_versions.get(schema_id, table_name), data_loader.index_checks[key])
+            data_loader.insert_row(table_name, schema_id, ['name'], {'name': 'new'})
+            self.assertNotEqual(table_versions.get(schema_id, table_name), data_loader.index_checks[key])
+            data_loader.get_table(schema_id, table_name, search='new')
+            self.assertEqual(table_versions.get(schema_id, table_name), data_loader.index_checks[key])
+
+            if not db.engine.execute("SELECT EXISTS(SELECT 1 FROM pg_available_extensions WHERE name='pg_trgm');") \
+                    .first()[0]:
+                self.skipTest('pg_trgm is not available')
+            data_loader.create_search_index(schema_id, table_name)
+            self.assertTrue(data_loader.has_search_index(schema_id, table_name))
+            self.assertEqual(2, len(data_loader._search_indexes(schema_id, table_name)))
+            data_loader.insert_column(schema_id, table_name, 'note', 'text')
+            # The text of a timestamp isn't immutable, it can't be indexed (nor keep the other columns from it)
+            data_loader.insert_column(schema_id, table_name, 'seen', 'timestamp')
+            data_loader.update_search_index(schema_id, table_name)
+            self.assertEqual(3, len(data_loader._search_indexes(schema_id, table_name, valid=True)))
+            self.assertNotIn(data_loader._search_index_name(table_name, 'seen'),
+                             data_loader._search_indexes(schema_id, table_name))
+            self.assertEqual(["it's"], [row[1] for row in data_loader.get_table(schema_id, table_name,
+                                                                                search="it'").rows])
+            data_loader.delete_search_index(schema_id, table_name)
+            self.assertFalse(data_loader.has_search_index(schema_id, table_name))
+            self.assertEqual(set(), data_loader._search_indexes(schema_id, table_name))
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_sort_index(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        columns = ['c' + str(i) for i in range(AUTO_INDEX_BUDGET + 1)]
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.create_table(table_name, schema_id, columns, column_types=['integer'] * len(columns))
+            db.engine.execute('INSERT INTO {}.{} ({}) SELECT {} FROM generate_series(1, {}) i;'.format(
+                *_ci('schema-' + str(schema_id), table_name), ', '.join(columns),
+                ', '.join('i %% 7' for _ in columns), AUTO_INDEX_MIN_ROWS))
+
+            expected = data_loader.get_table(schema_id, table_name, limit=5, ordering=('c0', 'desc')).rows
+            for _ in range(AUTO_INDEX_THRESHOLD - 1):
+                data_loader.get_table(schema_id, table_name, limit=5, ordering=('c0', 'desc'))
+            # The index is built in the background
+            while data_loader.index_builds:
+                time.sleep(0.05)
+            self.assertEqual(['c0'], data_loader.get_sort_indexes(schema_id, table_name))
+            index = data_loader._sort_index_name(table_name, 'c0')
+            self.assertIn(index, [row[0] for row in db.engine.execute(
+                'SELECT indexname FROM pg_indexes WHERE schemaname={};'.format(_cv('schema-' + str(schema_id))))])
+            self.assertEqual(expected, data_loader.get_table(schema_id, table_name, limit=5,
+                                                             ordering=('c0', 'desc')).rows)
+            # Its use was recorded, reading more pages sorted on it doesn't write it again right away
+            last_used = "SELECT last_used FROM Auto_Index WHERE id_dataset={} AND id_table={} AND " \
+                        "column_name='c0';".format(*_cv('schema-' + str(schema_id), table_name))
+            recorded = db.engine.execute(last_used).first()[0]
+            data_loader.get_table(schema_id, table_name, limit=5, ordering=('c0', 'desc'))
+            self.assertEqual(recorded, db.engine.execute(last_used).first()[0])
+
+            # The least recently used indexes make room for new ones
+            for column in columns[1:]:
+                data_loader.create_sort_index(schema_id, table_name, column)
+            self.assertEqual(sorted(columns[1:]), sorted(data_loader.get_sort_indexes(schema_id, table_name)))
+
+            data_loader.rename_column(schema_id, table_name, 'c1', 'first')
+            data_loader.delete_column(schema_id, table_name, 'c2')
+            indexes = data_loader.get_sort_indexes(schema_id, table_name)
+            self.assertIn('first', indexes)
+            self.assertNotIn('c2', indexes)
+            self.assertTrue(db.engine.execute('SELECT to_regclass({}) IS NOT NULL;'.format(_cv(
+                _ci('schema-' + str(schema_id)) + '.' + _ci(data_loader._sort_index_name(table_name, 'first')))))
+                            .first()[0])
+
+            # Undoing the rename renames the index back
+            action_id = db.engine.execute('SELECT MAX(action_id) FROM history WHERE id_dataset={} AND action_desc '
+                                          'LIKE {};'.format(*_cv('schema-' + str(schema_id), 'Renamed%%')))
+            history.undo_action(schema_id, table_name, action_id.first()[0])
+            self.assertIn('c1', data_loader.get_sort_indexes(schema_id, table_name))
+            self.assertTrue(db.engine.execute('SELECT to_regclass({}) IS NOT NULL;'.format(_cv(
+                _ci('schema-' + str(schema_id)) + '.' + _ci(data_loader._sort_index_name(table_name, 'c1')))))
+                            .first()[0])
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_full_text_search(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.create_table(table_name, schema_id, ['title', 'notes', 'amount'],
+                                     column_types=['varchar(255)', 'text', 'integer'])
+            for title, notes in [('Report', 'The cats were running in the garden'), ('Cats', 'Notes about a cat'),
+                                 ('Dogs', 'Nothing about cats running'), ('Garden', 'Running cats, for sure')]:
+                data_loader.insert_row(table_name, schema_id, ['title', 'notes'], {'title': title, 'notes': notes})
+            self.assertRaises(ValueError, data_loader.search_full_text, schema_id, table_name, 'cat')
+            self.assertRaises(ValueError, data_loader.create_full_text_index, schema_id, table_name, ['amount'])
+
+            data_loader.create_full_text_index(schema_id, table_name)
+            self.assertEqual(('english', ['title', 'notes']), data_loader.get_full_text_index(schema_id, table_name))
+            table = data_loader.search_full_text(schema_id, table_name, 'cat')
+            self.assertEqual((4, 4), (table.filtered_size, len(table.rows)))
+            self.assertEqual('Cats', table.rows[0][1])  # Matched twice
+            self.assertEqual(['Report', 'Garden'],
+                             [row[1] for row in data_loader.search_full_text(schema_id, table_name, 'garden').rows])
+            self.assertEqual(['Dogs'], [
+                row[1] for row in data_loader.search_full_text(schema_id, table_name, '"cats running"').rows])
+            self.assertEqual(['Nothing about cats running'], [
+                row[2] for row in data_loader.search_full_text(schema_id, table_name, 'noth* cat').rows])
+            table = data_loader.search_full_text(schema_id, table_name, 'cat', offset=1, limit=2)
+            self.assertEqual((4, 2), (table.filtered_size, len(table.rows)))
+            self.assertEqual([], data_loader.search_full_text(schema_id, table_name, "100% 'sure'").rows)
+
+            # The index follows renamed columns (and the renames being undone)
+            data_loader.rename_column(schema_id, table_name, 'notes', 'remarks')
+            self.assertEqual(('english', ['title', 'remarks']), data_loader.get_full_text_index(schema_id, table_name))
+            action_id = db.engine.execute('SELECT MAX(action_id) FROM history WHERE id_dataset={};'.format(
+                _cv('schema-' + str(schema_id)))).first()[0]
+            history.undo_action(schema_id, table_name, action_id)
+            self.assertEqual(('english', ['title', 'notes']), data_loader.get_full_text_index(schema_id, table_name))
+            self.assertEqual(2, len(data_loader.search_full_text(schema_id, table_name, 'garden').rows))
+
+            # It is built again after the table was rewritten
+            data_loader.rename_column(schema_id, table_name, 'notes', 'description')
+            data_loader.make_backup(schema_id, table_name)
+            data_loader.restore_backup(schema_id, table_name, data_loader.get_backups(schema_id, table_name)[0])
+            data_loader.update_full_text_index(schema_id, table_name)
+            self.assertEqual(2, len(data_loader.search_full_text(schema_id, table_name, 'garden').rows))
+            self.assertTrue(db.engine.execute("SELECT EXISTS(SELECT 1 FROM pg_indexes WHERE indexname LIKE '\\_fts\\_%%' "
+                                              "AND tablename={});".format(_cv(table_name))).first()[0])
+            # The index is only checked again once the table changed
+            key = ('full-text', 'schema-' + str(schema_id), table_name)
+            self.assertEqual(table_versions.get(schema_id, table_name), data_loader.index_checks[key])
+            # Cached results were found with the index, they're dropped along with it
+            version = table_versions.get(schema_id, table_name)
+            data_loader.delete_full_text_index(schema_id, table_name)
+            self.assertIsNone(data_loader.get_full_text_index(schema_id, table_name))
+            self.assertNotEqual(version, table_versions.get(schema_id, table_name))
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_import_from_tables(self):
+        table_name = 'test-table'
+        copy_name = 'test-copy'
+        schema_id = 0
+        copy_schema_id = 1
+        try:
+            data_loader.create_dataset('test-schema', username)
+            data_loader.create_dataset('test-copy-schema', username)
+            data_loader.create_table(table_name, schema_id, ['name', 'amount'], raw=True,
+                                     column_types=['text', 'integer'])
+            for name, amount in [('Smith', '1'), ('Doe', '2'), ('Roe', '3')]:
+                data_loader.insert_row(table_name, schema_id, ['name', 'amount'], {'name': name, 'amount': amount})
+
+            data_loader.import_from_tables(copy_schema_id, copy_name, [(schema_id, table_name), (schema_id, table_name)],
+                                           columns=['amount'], predicates=[['', 'amount', '>=', 2]])
+            self.assertEqual([[1, 2], [2, 3], [3, 2], [4, 3]], sorted(data_loader.get_table(copy_schema_id, copy_name).rows))
+            self.assertEqual(['integer', 'integer'], [column.type for column in
+                                                      data_loader.get_column_names_and_types(copy_schema_id, copy_name)])
+            self.assertEqual(sorted(data_loader.get_table(copy_schema_id, copy_name).rows),
+                             sorted(data_loader.get_table(copy_schema_id, '_raw_' + copy_name).rows))
+            self.assertEqual([copy_name], [table.name for table in data_loader.get_tables(copy_schema_id, username)])
+
+            data_loader.insert_row(copy_name, copy_schema_id, ['amount'], {'amount': '4'})
+            self.assertIn([5, 4], data_loader.get_table(copy_schema_id, copy_name).rows)
+            self.assertRaises(ValueError, data_loader.import_from_tables, copy_schema_id, copy_name,
+                              [(schema_id, table_name)])
+            self.assertRaises(ValueError, data_loader.import_from_tables, copy_schema_id, 'other',
+                              [(schema_id, table_name)], predicates=[['', 'amount', '; DROP', 1]])
+
+            # The sequence of a renamed table keeps its name, a new table with the old name gets another one
+            data_loader.update_table_metadata(copy_schema_id, copy_name, 'renamed', 'Renamed copy')
+            data_loader.import_from_tables(copy_schema_id, copy_name, [(schema_id, table_name)])
+            data_loader.insert_row(copy_name, copy_schema_id, ['name', 'amount'], {'name': 'Poe', 'amount': '4'})
+            self.assertIn([4, 'Poe', 4], data_loader.get_table(copy_schema_id, copy_name).rows)
+        finally:
+            data_loader.delete_table(copy_name, copy_schema_id)
+            if data_loader.table_exists('renamed', copy_schema_id):
+                data_loader.delete_table('renamed', copy_schema_id)
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(copy_schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_ingestion_job(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        csv_file = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        csv_file.write('name,amount\nSmith,1\nDoe,2\n')
+        csv_file.close()
+        try:
+            data_loader.create_dataset(schema_name, username)
+            job = job_manager.submit(csv_file.name, schema_id, table_name=table_name, owner=username)
+            self.assertEqual(job, job_manager.get_job(job.id))
+            job.future.result(timeout=30)
+            self.assertEqual('done', job.status)
+            self.assertEqual(2, job.rows)
+            self.assertEqual(job.total_bytes, job.bytes)
+            self.assertFalse(os.path.exists(csv_file.name))
+            self.assertEqual([job], job_manager.get_jobs(schema_id))
+            self.assertEqual([[1, 'Smith', '1'], [2, 'Doe', '2']], sorted(data_loader.get_table(schema_id, table_name).rows))
+
+            # Jobs for the same table run one after the other, the first one creates it and the others append
+            paths = list()
+            for _ in range(3):
+                with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as other_file:
+                    other_file.write('name,amount\nSmith,1\nDoe,2\n')
+                paths.append(other_file.name)
+            jobs = [job_manager.submit(path, schema_id, table_name='other-table', owner=username) for path in paths]
+            for job in jobs:
+                job.future.result(timeout=30)
+            self.assertEqual(['done'] * 3, [job.status for job in jobs])
+            self.assertEqual(6, len(data_loader.get_table(schema_id, 'other-table').rows))
+        finally:
+            if os.path.exists(csv_file.name):
+                os.remove(csv_file.name)
+            data_loader.delete_table(table_name, schema_id)
+            if data_loader.table_exists('other-table', schema_id):
+                data_loader.delete_table('other-table', schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_ingestion_job_dump(self):
+        schema_name = 'test-schema'
+        schema_id = 0
+        dump_file = tempfile.NamedTemporaryFile('w', suffix='.sql', delete=False)
+        dump_file.write("INSERT INTO public.lions (name, quote) VALUES ('simba', 'hakuna matata'), ('nala', NULL);\n")
+        dump_file.close()
+        try:
+            data_loader.create_dataset(schema_name, username)
+            job = job_manager.submit(dump_file.name, schema_id, owner=username)
+            job.future.result(timeout=30)
+            self.assertEqual(('done', None), (job.status, job.error))
+            self.assertEqual([[1, 'simba', 'hakuna matata'], [2, 'nala', None]],
+                             sorted(data_loader.get_table(schema_id, 'lions').rows))
+        finally:
+            if os.path.exists(dump_file.name):
+                os.remove(dump_file.name)
+            if data_loader.table_exists('lions', schema_id):
+                data_loader.delete_table('lions', schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_resumable_upload(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        data = 'name,amount\n' + ''.join('name{},{}\n'.format(i, i) for i in range(1000))
+        data = data.encode()
+        chunks = [data[i:i + 1024] for i in range(0, len(data), 1024)]
+        try:
+            data_loader.create_dataset(schema_name, username)
+            upload = job_manager.create_upload(schema_id, 'upload.csv', len(data), chunk_size=1024, owner=username,
+                                               table_name=table_name)
+            # CSV files are imported while they're being uploaded
+            self.assertIsNotNone(upload.job)
+            with self.assertRaises(ValueError):
+                upload.add_chunk(0, chunks[0], hashlib.sha256(b'other data').hexdigest())
+            with self.assertRaises(ValueError):
+                upload.add_chunk(1, chunks[1], hashlib.sha256(chunks[1]).hexdigest())
+            for index, chunk in enumerate(chunks):
+                upload.add_chunk(index, chunk, hashlib.sha256(chunk).hexdigest())
+                # Resending a chunk that was already received is fine
+                upload.add_chunk(index, chunk, hashlib.sha256(chunk).hexdigest())
+            self.assertEqual(len(chunks), upload.next_chunk)
+            job = job_manager.finish_upload(upload)
+            job.future.result(timeout=30)
+            self.assertEqual(('done', 1000), (job.status, job.rows))
+            self.assertEqual(len(data), job.bytes)
+            self.assertFalse(os.path.exists(upload.path))
+            self.assertEqual(1000, data_loader.get_table(schema_id, table_name, limit=0).total_size)
+        finally:
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_idle_uploads(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        manager = IngestionJobManager(data_loader, workers=1, streaming_workers=1)
+        csv_file = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        csv_file.write('name,amount\nSmith,1\nDoe,2\n')
+        csv_file.close()
+        try:
+            data_loader.create_dataset(schema_name, username)
+            uploads = [manager.create_upload(schema_id, 'upload.csv', 1024, owner=username, table_name='idle' + str(i))
+                       for i in range(2)]
+            # Uploads waiting for their chunks don't hold up the import of other files
+            job = manager.submit(csv_file.name, schema_id, table_name=table_name, owner=username)
+            job.future.result(timeout=30)
+            self.assertEqual('done', job.status)
+
+            # Stale uploads are aborted, their jobs fail
+            for upload in uploads:
+                upload.last_activity = datetime.now() - timedelta(seconds=UPLOAD_TIMEOUT_SECONDS + 1)
+            with manager._lock:
+                manager._remove_stale_uploads()
+            for upload in uploads:
+                upload.job.future.result(timeout=30)
+                self.assertEqual('failed', upload.job.status)
+                self.assertIsNone(manager.get_upload(upload.id))
+            self.assertFalse(data_loader.table_exists('idle0', schema_id))
+        finally:
+            if os.path.exists(csv_file.name):
+                os.remove(csv_file.name)
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_ingestion_job_compressed(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        csv_file = tempfile.NamedTemporaryFile(suffix='.csv.gz', delete=False)
+        csv_file.write(gzip.compress(b'name,amount\nSmith,1\nDoe,2\n'))
+        csv_file.close()
+        dump_file = tempfile.NamedTemporaryFile(suffix='.sql.xz', delete=False)
+        dump_file.write(lzma.compress(b"INSERT INTO lions (name) VALUES ('simba'), ('nala');\n"))
+        dump_file.close()
+        try:
+            data_loader.create_dataset(schema_name, username)
+            csv_job = job_manager.submit(csv_file.name, schema_id, table_name=table_name, owner=username)
+            dump_job = job_manager.submit(dump_file.name, schema_id, owner=username)
+            csv_job.future.result(timeout=30)
+            dump_job.future.result(timeout=30)
+            self.assertEqual(('done', 2), (csv_job.status, csv_job.rows))
+            self.assertEqual(('done', 2), (dump_job.status, dump_job.rows))
+            self.assertEqual(csv_job.total_bytes, csv_job.bytes)
+            self.assertEqual([[1, 'Smith', '1'], [2, 'Doe', '2']], sorted(data_loader.get_table(schema_id, table_name).rows))
+            self.assertEqual([[1, 'simba'], [2, 'nala']], sorted(data_loader.get_table(schema_id, 'lions').rows))
+        finally:
+            for file in [csv_file, dump_file]:
+                if os.path.exists(file.name):
+                    os.remove(file.name)
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_table('lions', schema_id)
+            data_loader.delete_dataset(schema_id)
+
+    def test_parquet_export_import(self):
+        schema_name = 'test-schema'
+        table_name = 'test-table'
+        schema_id = 0
+        csv_file = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        csv_file.write('name,amount,price,available,added\nSmith,1,1.5,true,2018-01-01\nDoe,,2.25,false,\n')
+        csv_file.close()
+        parquet_file = tempfile.NamedTemporaryFile(suffix='.parquet', delete=False)
+        parquet_file.close()
+        try:
+            data_loader.create_dataset(schema_name, username)
+            data_loader.process_csv(csv_file.name, schema_id, table_name, type_deduction=True)
+            data_loader.export_table(parquet_file.name, schema_id, table_name, file_format='parquet')
+            data_loader.process_parquet(parquet_file.name, schema_id, 'imported')
+            table = data_loader.get_table(schema_id, table_name)
+            imported = data_loader.get_table(schema_id, 'imported')
+            self.assertEqual(sorted(table.rows), sorted(imported.rows))
+            self.assertEqual(['integer', 'text', 'integer', 'double', 'boolean', 'date'],
+                             [column.type for column in data_loader.get_column_names_and_types(schema_id, 'imported')])
+            self.assertEqual(sorted(imported.rows), sorted(data_loader.get_table(schema_id, '_raw_imported').rows))
+
+            # Numeric values aren't rounded, they're decimals if their precision is declared, else strings, and
+            # timestamps keep their time zone
+            data_loader.create_table('prices', schema_id, ['price', 'ratio', 'sold'],
+                                     column_types=['numeric(10,2)', 'numeric', 'timestamp with time zone'])
+            data_loader.insert_row('prices', schema_id, ['price', 'ratio', 'sold'],
+                                   {'price': '12345678.91', 'ratio': '0.1000000000000000000001',
+                                    'sold': '2018-01-01 12:00:00+02'})
+            data_loader.export_table(parquet_file.name, schema_id, 'prices', file_format='parquet')
+            data_loader.process_parquet(parquet_file.name, schema_id, 'imported_prices')
+            self.assertEqual(['numeric', 'text', 'timestamp with time zone'],
+                             [type for _, type in data_loader._table_columns(schema_id, 'imported_prices')[1:]])
+            rows = data_loader.get_table(schema_id, 'imported_prices').rows
+            self.assertEqual([[1, '12345678.91', '0.1000000000000000000001']],
+                             [[row[0]] + [str(value) for value in row[1:3]] for row in rows])
+            self.assertEqual(data_loader.get_table(schema_id, 'prices').rows[0][3], rows[0][3])
+        finally:
+            os.remove(csv_file.name)
+            os.remove(parquet_file.name)
+            data_loader.delete_table(table_name, schema_id)
+            data_loader.delete_table('imported', schema_id)
+            if data_loader.table_exists('prices', schema_id):
+                data_loader.delete_table('prices', schema_id)
+            if data_loader.table_exists('imported_prices', schema_id):
+                data_loader.delete_table('imported_prices', schema_id)
+            data_loader.delete_dataset(schema_id)
+
     def test_grant_access(self):
         contrib_username = "contrib_test_username"
         contrib_password = "contrib_test_pass"
@@ -8,7 +8,7 @@ from recordlinkage.preprocessing import clean
 from app import app, database as db
 from app.data_transform.helpers import create_serial_sequence
 from app.data_service.models import DataLoader, Table
-from app.history.models import History
+from app.history.models import History, row_counts, table_columns, table_versions
 
 
 def _ci(*args: str):
@@ -463,6 +463,9 @@ class DataDeduplicator:
                                                                              identical_rows_query)
 
             db.engine.execute(delete_rows_query)
+            row_counts.invalidate(schema_id, table_name)
+            table_versions.bump(schema_id, table_name)
+            table_columns.invalidate(schema_id, table_name)
         except Exception as e:
             app.logger.error("[ERROR] Unable to remove identical rows from table '{}'".format(table_name))
             app.logger.exception(e)
@@ -517,6 +520,9 @@ class DataDeduplicator:
             app.logger.error("[ERROR] Could not create view for \'duplicate\' rows for table '{}'".format(table_name))
             app.logger.exception(e)
             raise e
+        finally:
+            # The view has the columns the table has now
+            table_columns.invalidate(schema_id, dedup_view_name)
 
     def collect_identical_rows_alg(self, schema_id, table_name, sorting_key, fixed_column_names, var_column_names, alg):
 
@@ -9,7 +9,7 @@ _history = Blueprint('_history', __name__)
 @_history.route('/datasets/<int:dataset_id>/tables/<string:table_name>/history', methods=['GET'])
 def get_history(dataset_id, table_name):
     try:
-        table = data_loader.get_table(dataset_id, table_name)
+        table = data_loader.get_table_outline(dataset_id, table_name)
         return render_template('history/history.html', table=table)
     except Exception:
         return redirect(url_for('data_service.get_dataset', dataset_id=dataset_id), code=303)
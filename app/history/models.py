@@ -1,3 +1,8 @@
+import itertools
+import threading
+import uuid
+from collections import OrderedDict
+
 from app import app, database as db
 
 
@@ -13,12 +18,148 @@ def _cv(*args: str):
     return ["'{}'".format(str(arg).replace("'", "''")) for arg in args]
 
 
+class TableVersions:
+    """
+     Keeps a version for every table, which changes whenever its rows or columns might have changed, so results read
+     from a table can be cached (and served with an ETag) until it changes. Versions start with a token of the
+     process, they're never reused after a restart.
+    """
+
+    def __init__(self):
+        self.token = uuid.uuid4().hex[:8]
+        self.counter = itertools.count(1)
+        self.versions = dict()  # (dataset_id, table_name) -> number
+        self.datasets = dict()  # dataset_id -> number, changed when the dataset is deleted
+        self.lock = threading.Lock()
+
+    def get(self, dataset_id, table_name):
+        with self.lock:
+            return '{}-{}-{}'.format(self.token, self.datasets.get(str(dataset_id), 0),
+                                     self.versions.get((str(dataset_id), table_name), 0))
+
+    def bump(self, dataset_id, table_name):
+        with self.lock:
+            self.versions[(str(dataset_id), table_name)] = next(self.counter)
+
+    def bump_dataset(self, dataset_id):
+        with self.lock:
+            self.datasets[str(dataset_id)] = next(self.counter)
+
+
+table_versions = TableVersions()
+
+
+class RowCountCache:
+    """
+     Keeps the row count of tables, and of the rows matching a search in them, so paging through a table doesn't
+     count all of its rows for every page. Actions on a table either adjust its count (when the amount of added or
+     deleted rows is known) or drop its counts, which are then counted again when needed.
+     Both change the version of the table, a count made while the table changed isn't kept.
+    """
+
+    def __init__(self, versions, max_searches=100):
+        self.versions = versions
+        self.max_searches = max_searches
+        self.counts = dict()  # (dataset_id, table_name) -> OrderedDict of search -> count, None being the whole table
+        self.lock = threading.Lock()
+
+    def get(self, dataset_id, table_name, search=None):
+        with self.lock:
+            return self.counts.get((str(dataset_id), table_name), {}).get(search or None)
+
+    def set(self, dataset_id, table_name, version, count, search=None):
+        """ Keeps a count, unless the table changed since version (read before counting) """
+        with self.lock:
+            if self.versions.get(dataset_id, table_name) != version:
+                return
+            counts = self.counts.setdefault((str(dataset_id), table_name), OrderedDict())
+            counts[search or None] = count
+            counts.move_to_end(search or None)
+            while len(counts) > self.max_searches + 1:
+                del counts[next(term for term in counts if term is not None)]
+
+    def add(self, dataset_id, table_name, rows):
+        """ Adjusts the count of a table after rows were inserted (or deleted, with a negative amount) """
+        self.versions.bump(dataset_id, table_name)
+        with self.lock:
+            total = self.counts.pop((str(dataset_id), table_name), {}).get(None)
+            # Counts of searches can't be adjusted without knowing which rows changed
+            if total is not None:
+                self.counts[(str(dataset_id), table_name)] = OrderedDict([(None, total + rows)])
+
+    def invalidate(self, dataset_id, table_name):
+        self.versions.bump(dataset_id, table_name)
+        with self.lock:
+            self.counts.pop((str(dataset_id), table_name), None)
+
+    def invalidate_dataset(self, dataset_id):
+        self.versions.bump_dataset(dataset_id)
+        with self.lock:
+            for key in [key for key in self.counts if key[0] == str(dataset_id)]:
+                del self.counts[key]
+
+
+row_counts = RowCountCache(table_versions)
+
+
+class ColumnCache:
+    """
+     Keeps the columns (name and type, in table order) of tables, so they don't have to be looked up in the catalog
+     for every request. Every path changing the columns of a table drops its entry, tables without columns (tables
+     that don't exist) aren't kept. Dropping an entry changes the version of the table, columns read while the table
+     changed aren't kept.
+    """
+
+    def __init__(self, versions):
+        self.versions = versions
+        self.columns = dict()  # (dataset_id, table_name) -> list of (column name, data type)
+        self.lock = threading.Lock()
+
+    def get(self, dataset_id, table_name):
+        with self.lock:
+            columns = self.columns.get((str(dataset_id), table_name))
+            return list(columns) if columns is not None else None
+
+    def set(self, dataset_id, table_name, version, columns):
+        """ Keeps the columns of a table, unless it changed since version (read before reading the columns) """
+        if columns:
+            with self.lock:
+                if self.versions.get(dataset_id, table_name) != version:
+                    return
+                self.columns[(str(dataset_id), table_name)] = list(columns)
+
+    def invalidate(self, dataset_id, table_name):
+        self.versions.bump(dataset_id, table_name)
+        with self.lock:
+            self.columns.pop((str(dataset_id), table_name), None)
+
+    def invalidate_dataset(self, dataset_id):
+        self.versions.bump_dataset(dataset_id)
+        with self.lock:
+            for key in [key for key in self.columns if key[0] == str(dataset_id)]:
+                del self.columns[key]
+
+
+table_columns = ColumnCache(table_versions)
+
+
 class History:
     def __init__(self):
         pass
 
-    def log_action(self, dataset_id, table_name, date, desc, inverse_query):
+    def log_action(self, dataset_id, table_name, date, desc, inverse_query, row_delta=None):
+        """
+         Saves an action on a table. Row_delta is the amount of rows the action added to (or removed from) the
+         table, when it isn't given the table might have changed in any way and its cached row counts and columns
+         are dropped.
+        """
         dataset_name = 'schema-' + str(dataset_id)
+        table_versions.bump(dataset_id, table_name)
+        if row_delta is None:
+            row_counts.invalidate(dataset_id, table_name)
+            table_columns.invalidate(dataset_id, table_name)
+        else:
+            row_counts.add(dataset_id, table_name, row_delta)
         try:
             db.engine.execute(
                     "INSERT INTO HISTORY (id_dataset, id_table, date, action_desc, inv_query, undone) VALUES ({}, {}, '{}', {}, {}, FALSE)".format(*_cv(dataset_name, table_name), date, *_cv(desc, inverse_query)))
@@ -66,6 +207,20 @@ class History:
             app.logger.exception(e)
             raise e
 
+    def count_actions(self, dataset_id, table_name, search=None):
+        """ Returns the amount of actions in the history of a table, or of those whose description contains search """
+        dataset_name = 'schema-' + str(dataset_id)
+        try:
+            condition = 'id_dataset={} AND id_table={}'.format(*_cv(dataset_name, table_name))
+            if search:
+                condition += ' AND action_desc LIKE {}'.format(_cv('%' + search + '%').replace('%', '%%'))
+            return db.engine.execute('SELECT COUNT(*) FROM HISTORY WHERE {};'.format(condition)).fetchone()[0]
+        except Exception as e:
+            app.logger.error(
+                "[ERROR] Failed to count actions in history of {}.{}".format(dataset_name, table_name))
+            app.logger.exception(e)
+            raise e
+
     def undo_action(self, dataset_id, table_name, action_id):
         dataset_name = 'schema-' + str(dataset_id)
         try:
@@ -80,6 +235,10 @@ class History:
             app.logger.error('[ERROR] Failed to undo action with id {}'.format(action_id))
             app.logger.exception(e)
             raise e
+        finally:
+            table_versions.bump(dataset_id, table_name)
+            row_counts.invalidate(dataset_id, table_name)
+            table_columns.invalidate(dataset_id, table_name)
         try:
             db.engine.execute('UPDATE HISTORY SET UNDONE=TRUE WHERE ACTION_ID={}'.format(action_id))
         except Exception as e:
@@ -0,0 +1,184 @@
+'use strict';
+
+/**
+ * Keeps a sliding window of blocks of rows of a table in the browser, for a DataTables grid scrolling through
+ * the whole table (with the Scroller extension) instead of paging.
+ *
+ * Rows are read from the table API in blocks of blockSize rows, aligned on multiples of blockSize, so the pages
+ * the grid asks for while scrolling are served from blocks it already has. After every draw, the blocks ahead of
+ * the scroll direction are fetched. A block next to a block that's already known is fetched with its cursor, so
+ * the API doesn't have to skip all the rows before it. At most maxBlocks blocks are kept, the ones used least
+ * recently are dropped first.
+ *
+ * @param url The url of the table in the API.
+ * @param columns The names of all columns of the grid, the ones that aren't sent are null in the rows.
+ * @param options blockSize, maxBlocks and prefetch (the amount of blocks fetched ahead).
+ */
+var TableBlocks = function () {
+    function TableBlocks(url, columns, options) {
+        options = options || {};
+        this.url = url;
+        this.columns = columns;
+        this.blockSize = options.blockSize || 500;
+        this.maxBlocks = options.maxBlocks || 40;
+        this.prefetch = options.prefetch || 2;
+        this.key = null;
+        this.blocks = {}; // block index -> promise of the block (the API response)
+        this.used = []; // block indexes, the one used least recently first
+        this.lastStart = 0;
+    }
+
+    /**
+     * Serves a request of the grid (the ajax option of DataTables): the rows from request.start on, at most
+     * request.length of them. The other parameters of the request are sent to the API as they are.
+     *
+     * @param request The request DataTables makes.
+     * @param callback The callback DataTables passes, called with the page.
+     */
+    TableBlocks.prototype.draw = function (request, callback) {
+        var self = this;
+        var params = $.extend({}, request);
+        delete params.start;
+        delete params.length;
+        delete params.draw;
+        var key = JSON.stringify(params);
+        if (key !== this.key) {
+            // Another ordering, search or set of columns, none of the blocks can be used
+            this.key = key;
+            this.params = params;
+            this.blocks = {};
+            this.used = [];
+            this.lastStart = 0;
+        }
+
+        var forward = request.start >= this.lastStart;
+        this.lastStart = request.start;
+        var first = Math.floor(request.start / this.blockSize);
+        var last = Math.floor((request.start + Math.max(request.length, 1) - 1) / this.blockSize);
+        var blocks = [];
+        for (var index = first; index <= last; index++) {
+            blocks.push(this.fetch(index));
+        }
+
+        $.when.apply($, blocks).done(function () {
+            var responses = Array.prototype.slice.call(arguments, 0, blocks.length);
+            var rows = [];
+            responses.forEach(function (response) {
+                rows = rows.concat(self.objects(response));
+            });
+            var offset = request.start - first * self.blockSize;
+            callback({
+                draw: request.draw,
+                recordsTotal: responses[0].recordsTotal,
+                recordsFiltered: responses[0].recordsFiltered,
+                data: rows.slice(offset, offset + request.length)
+            });
+            if (key === self.key) {
+                self.ahead(forward ? last + 1 : first - 1, forward ? 1 : -1, self.prefetch, responses[0]);
+            }
+        }).fail(function () {
+            callback({draw: request.draw, recordsTotal: 0, recordsFiltered: 0, data: []});
+        });
+    };
+
+    /**
+     * Fetches the blocks ahead of the scroll direction, one after the other, so each one can use the cursor of
+     * the one before it.
+     */
+    TableBlocks.prototype.ahead = function (index, step, count, response) {
+        var self = this;
+        var key = this.key;
+        if (count <= 0 || index < 0 || index * this.blockSize >= response.recordsFiltered) {
+            return;
+        }
+        this.fetch(index).done(function (response) {
+            if (key === self.key) {
+                self.ahead(index + step, step, count - 1, response);
+            }
+        });
+    };
+
+    /**
+     * Returns a promise of a block, it's only requested from the API when it isn't kept (or being fetched).
+     */
+    TableBlocks.prototype.fetch = function (index) {
+        var self = this;
+        var key = this.key;
+        this.use(index);
+        if (this.blocks[index]) {
+            return this.blocks[index];
+        }
+
+        // Without the draw counter, so a block that didn't change can be answered with a 304
+        var params = $.extend({}, this.params, {start: index * this.blockSize, length: this.blockSize});
+        var before = this.response(index - 1);
+        var after = this.response(index + 1);
+        if (before && before.next_cursor) {
+            params.cursor = before.next_cursor;
+        } else if (after && after.prev_cursor) {
+            params.cursor = after.prev_cursor;
+        }
+        // Only the response is passed on (not the status and request), so $.when gets a value per block
+        var block = $.ajax({url: this.url, data: params, dataType: 'json'}).then(function (response) {
+            return response;
+        });
+        block.fail(function () {
+            if (key === self.key && self.blocks[index] === block) {
+                delete self.blocks[index];
+            }
+        });
+        this.blocks[index] = block;
+        this.evict();
+        return block;
+    };
+
+    /**
+     * Returns the API response of a block if it's been received, else undefined.
+     */
+    TableBlocks.prototype.response = function (index) {
+        var block = this.blocks[index];
+        var response;
+        if (block && block.state() === 'resolved') {
+            block.done(function (value) {
+                response = value;
+            });
+        }
+        return response;
+    };
+
+    TableBlocks.prototype.use = function (index) {
+        var position = this.used.indexOf(index);
+        if (position >= 0) {
+            this.used.splice(position, 1);
+        }
+        this.used.push(index);
+    };
+
+    /**
+     * Drops the blocks used least recently while there are more than maxBlocks.
+     */
+    TableBlocks.prototype.evict = function () {
+        while (this.used.length > this.maxBlocks) {
+            delete this.blocks[this.used.shift()];
+        }
+    };
+
+    /**
+     * Returns the rows of an API response (sent with the rows layout) as objects, with every column of the grid.
+     */
+    TableBlocks.prototype.objects = function (response) {
+        var columns = this.columns;
+        return response.data.map(function (values) {
+            var row = {};
+            columns.forEach(function (column) {
+                row[column] = null;
+            });
+            response.columns.forEach(function (column, i) {
+                row[column] = values[i];
+            });
+            return row;
+        });
+    };
+
+    return TableBlocks;
+}();
@@ -0,0 +1,242 @@
+"""
+Ingestion benchmark for DataLoader.process_csv, process_zip and process_dump.
+
+Synthetic files modeled on demo/TechCrunchcontinentalUSA.csv and input/employees.csv are generated
+(and kept in --data-dir, so later runs can reuse them) and loaded into a throwaway dataset of the
+local test database. Every case runs in its own process, so its peak RSS can be measured.
+For every case the rows/sec, peak RSS and the time spent per phase are written to a JSON file:
+ - type_deduction: TypeInferrer.infer & convert
+ - load: COPY of the rows into the working table (bulk_load / copy_rows)
+ - raw_copy: filling the _raw_ table (copy_to_raw)
+ - setup: creating the tables (create_table)
+ - parse: everything else (reading & parsing the file)
+Phases are summed over worker threads, for ZIP archives they can add up to more than the total time.
+
+Usage (from the root of the repository):
+    python benchmarks/ingestion.py --sizes 10000 100000 --output results.json
+    python benchmarks/ingestion.py --compare old.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from zipfile import ZipFile, ZIP_DEFLATED
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = [10000, 100000, 1000000, 10000000]
+CASES = ['csv-techcrunch', 'csv-techcrunch-types', 'csv-employees', 'zip', 'dump-employees']
+BENCHMARK_USER = 'benchmark_user'
+BENCHMARK_DATASET = 'benchmark'
+
+TECHCRUNCH_COLUMNS = ['permalink', 'company', 'numEmps', 'category', 'city', 'state', 'fundedDate', 'raisedAmt',
+                      'raisedCurrency', 'round']
+EMPLOYEES_COLUMNS = ['emp_no', 'birth_date', 'first_name', 'last_name', 'gender', 'hire_date']
+CATEGORIES = ['web', 'software', 'hardware', 'mobile', 'cleantech', 'biotech', 'consulting', 'other']
+CITIES = [('Tempe', 'AZ'), ('San Francisco', 'CA'), ('Palo Alto', 'CA'), ('New York', 'NY'), ('Seattle', 'WA'),
+          ('Austin', 'TX'), ('Boston', 'MA'), ('Chicago', 'IL')]
+ROUNDS = ['seed', 'angel', 'a', 'b', 'c', 'd', 'unattributed']
+FIRST_NAMES = ['Georgi', 'Bezalel', 'Parto', 'Chirstian', 'Kyoichi', 'Anneke', 'Tzvetan', 'Saniya', 'Sumant', 'Duangkaew']
+LAST_NAMES = ['Facello', 'Simmel', 'Bamford', 'Koblick', 'Maliniak', 'Preusig', 'Zielinski', 'Kalloufi', 'Peac']
+
+
+def techcrunch_rows(size, seed=0):
+    rng = random.Random(seed)
+    for i in range(size):
+        city, state = rng.choice(CITIES)
+        company = 'Company {}'.format(i // 3)
+        funded = date(1999, 1, 1) + timedelta(days=rng.randrange(3650))
+        yield [company.lower().replace(' ', '-'), company, str(rng.randrange(1, 5000)) if rng.random() < 0.7 else '',
+               rng.choice(CATEGORIES), city, state, funded.strftime('%-d-%b-%y'), str(rng.randrange(10, 5000) * 10000),
+               'USD', rng.choice(ROUNDS)]
+
+
+def employees_rows(size, seed=0):
+    rng = random.Random(seed)
+    for i in range(size):
+        birth = date(1952, 1, 1) + timedelta(days=rng.randrange(4745))
+        hire = date(1985, 1, 1) + timedelta(days=rng.randrange(5110))
+        yield [str(10001 + i), birth.isoformat(), rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), rng.choice('MF'),
+               hire.isoformat()]
+
+
+def write_csv(path, columns, rows):
+    import csv
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def write_dump(path, table, columns, rows):
+    # Like pg_dump --inserts: a statement per row
+    header = 'INSERT INTO public.{} ({}) VALUES '.format(table, ', '.join(columns))
+    with open(path, 'w') as file:
+        file.write('--\n-- Synthetic dump of {}\n--\n\n'.format(table))
+        for row in rows:
+            values = ', '.join("'" + value.replace("'", "''") + "'" if value else 'NULL' for value in row)
+            file.write(header + '(' + values + ');\n')
+
+
+def generate(case, size, data_dir):
+    """ Returns the path of the input file of a case, generating it if it doesn't exist yet """
+    extension = {'zip': 'zip', 'dump-employees': 'sql'}.get(case, 'csv')
+    name = case.replace('-types', '')
+    path = os.path.join(data_dir, '{}-{}.{}'.format(name, size, extension))
+    if os.path.exists(path):
+        return path
+
+    partial = path + '.partial'
+    if name == 'csv-techcrunch':
+        write_csv(partial, TECHCRUNCH_COLUMNS, techcrunch_rows(size))
+    elif name == 'csv-employees':
+        write_csv(partial, EMPLOYEES_COLUMNS, employees_rows(size))
+    elif name == 'dump-employees':
+        write_dump(partial, 'employees', EMPLOYEES_COLUMNS, employees_rows(size))
+    elif name == 'zip':
+        # Half of the rows in each table, both split over 2 files to exercise appending
+        with ZipFile(partial, 'w', ZIP_DEFLATED) as archive:
+            for table, columns, rows in [('techcrunch', TECHCRUNCH_COLUMNS, techcrunch_rows),
+                                         ('employees', EMPLOYEES_COLUMNS, employees_rows)]:
+                for part in range(2):
+                    member = os.path.join(data_dir, '{}.csv'.format(table))
+                    write_csv(member, columns, rows(size // 4, seed=part))
+                    archive.write(member, '{}/part{}/{}.csv'.format(table, part, table))
+                    os.remove(member)
+    os.rename(partial, path)
+    return path
+
+
+def run_case(case, path):
+    """ Loads a file into a new dataset and returns the measurements, runs in a separate process """
+    sys.path.insert(0, BASE_DIR)
+    from app import data_loader, user_data_access, database as db
+    from app.data_service.models import DataLoader, TypeInferrer, _ci
+    from app.user_service.models import User
+
+    phases = {'type_deduction': 0.0, 'load': 0.0, 'raw_copy': 0.0, 'setup': 0.0}
+    lock = threading.Lock()
+
+    def timed(cls, method, phase):
+        original = getattr(cls, method)
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                with lock:
+                    phases[phase] += time.perf_counter() - start
+        setattr(cls, method, wrapper)
+
+    timed(TypeInferrer, 'infer', 'type_deduction')
+    timed(TypeInferrer, 'convert', 'type_deduction')
+    timed(DataLoader, 'bulk_load', 'load')
+    timed(DataLoader, 'copy_rows', 'load')
+    timed(DataLoader, 'copy_to_raw', 'raw_copy')
+    timed(DataLoader, 'create_table', 'setup')
+
+    try:
+        user_data_access.get_user(BENCHMARK_USER)
+    except Exception:
+        user_data_access.add_user(User(BENCHMARK_USER, 'benchmark', 'Bench', 'Mark', 'benchmark@localhost', 'user',
+                                       True))
+    data_loader.create_dataset(BENCHMARK_DATASET, BENCHMARK_USER)
+    schema_id = max(int(name.split('-')[1]) for name in data_loader.get_dataset_id(BENCHMARK_DATASET))
+    try:
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        if case == 'zip':
+            data_loader.process_zip(path, schema_id, type_deduction=True)
+        elif case == 'dump-employees':
+            data_loader.process_dump(path, schema_id, 'employees')
+        else:
+            data_loader.process_csv(path, schema_id, 'benchmark', type_deduction=case.endswith('-types'))
+        seconds = time.perf_counter() - start
+        # Counted exactly, total_size is an estimate for tables of ROW_COUNT_ESTIMATE_THRESHOLD rows or more
+        rows = 0
+        for table in data_loader.get_tables(schema_id, BENCHMARK_USER):
+            if not table.name.startswith('_raw_'):
+                rows += db.engine.execute('SELECT count(*) FROM {}.{};'.format(
+                    *_ci('schema-' + str(schema_id), table.name))).fetchone()[0]
+    finally:
+        data_loader.delete_dataset(schema_id)
+
+    phases['parse'] = max(seconds - sum(phases.values()), 0.0)
+    return {'rows': rows, 'seconds': seconds, 'rows_per_sec': rows / seconds if seconds else None,
+            # ru_maxrss is in kilobytes on Linux
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'rss_before_mb': rss_before / 1024, 'phases': phases}
+
+
+def git_version():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    old_results = {(r['case'], r['size']): r for r in old['results']}
+    print('{:<22}{:>10}{:>14}{:>14}{:>9}'.format('case', 'size', 'old rows/s', 'new rows/s', 'change'))
+    for result in new['results']:
+        previous = old_results.get((result['case'], result['size']))
+        if previous is None or not previous['rows_per_sec'] or not result['rows_per_sec']:
+            continue
+        change = result['rows_per_sec'] / previous['rows_per_sec'] - 1
+        print('{:<22}{:>10}{:>14.0f}{:>14.0f}{:>+8.1%}'.format(result['case'], result['size'],
+                                                              previous['rows_per_sec'], result['rows_per_sec'], change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ingestion of CSV files, ZIP archives and SQL dumps')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='amounts of rows per file')
+    parser.add_argument('--cases', nargs='+', default=CASES, choices=CASES)
+    parser.add_argument('--data-dir', default=os.path.join(BASE_DIR, 'benchmarks', 'data'),
+                        help='directory for the generated input files')
+    parser.add_argument('--output', default=None, help='JSON file to write the results to')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    parser.add_argument('--run-case', nargs=2, metavar=('CASE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.run_case:
+        print(json.dumps(run_case(*args.run_case)))
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    version = git_version()
+    results = list()
+    for size in args.sizes:
+        for case in args.cases:
+            path = generate(case, size, args.data_dir)
+            # NOTE: config.py uses the test database when the process gets any command line arguments
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--run-case', case, path],
+                                             cwd=BASE_DIR)
+            result = dict(case=case, size=size, file_bytes=os.path.getsize(path),
+                          **json.loads(output.decode().strip().splitlines()[-1]))
+            results.append(result)
+            print('{:<22}{:>10} rows {:>8.2f}s {:>12.0f} rows/s {:>8.1f} MB peak RSS'.format(
+                case, size, result['seconds'], result['rows_per_sec'] or 0, result['peak_rss_mb']))
+
+    report = {'version': version, 'date': datetime.now().isoformat(), 'python': platform.python_version(),
+              'machine': platform.platform(), 'cpus': os.cpu_count(), 'results': results}
+    output = args.output or os.path.join(BASE_DIR, 'benchmarks', 'results-{}.json'.format(version or 'unknown'))
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print('Results written to ' + output)
+
+
+if __name__ == '__main__':
+    main()
@@ -23,8 +23,32 @@ CSRF_SESSION_KEY = 'NotSoSecret'
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 SECRET_KEY = '*^*(*&)(*)(*afafafaSDD47j\3yX R~X@H!jmM]Lwf/,?KT'
 
-ALLOWED_EXTENSIONS = ['zip', 'csv', 'dump', 'sql']
+ALLOWED_EXTENSIONS = ['zip', 'csv', 'jsonl', 'dump', 'sql', 'parquet']
+COMPRESSED_EXTENSIONS = ['gz', 'bz2', 'xz'] # csv, jsonl, dump & sql files compressed with gzip, bzip2 or xz are accepted as well
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'input')
+CSV_CHUNK_SIZE = 50000 # amount of rows read & loaded at once when importing a CSV file
+TYPE_INFERENCE_SAMPLE_SIZE = 1000 # amount of rows used to decide the column types of an imported file
+# Amount of CSV files from a ZIP archive that are imported at the same time
+# (every worker uses up to 2 connections, keep this well below the size of the connection pool)
+ZIP_WORKERS = min(os.cpu_count() or 1, 4)
+INGESTION_WORKERS = 2 # amount of uploaded files that are imported at the same time, in the background
+JOB_RETENTION_SECONDS = 3600 # how long the result of a finished import job can be looked up
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024 # default size (in bytes) of the chunks of a resumable upload
+# Amount of resumable uploads that are imported while their chunks are still arriving, on workers of their own
+# (a streamed import waits for its client, it mustn't hold up the other imports)
+STREAMING_WORKERS = 4
+UPLOAD_TIMEOUT_SECONDS = 3600 # a resumable upload without new chunks for this long is aborted
+UPLOAD_CHECK_SECONDS = 60 # how often resumable uploads are checked for the timeout
+ROW_COUNT_ESTIMATE_THRESHOLD = 1000000 # tables estimated to hold more rows aren't counted, the estimate is shown
+STREAM_BATCH_SIZE = 1000 # amount of rows fetched (and sent) at once when a page of a table is streamed
+PAGE_CACHE_SIZE = 64 * 1024 * 1024 # amount of bytes of table pages kept in memory, to be sent again as long as they're unchanged
+PAGE_CACHE_MAX_PAGE = 1024 * 1024 # larger pages (in bytes) aren't kept
+AUTO_INDEX_THRESHOLD = 3 # a column gets a sort index after the pages of its table were sorted on it this many times
+AUTO_INDEX_MIN_ROWS = 10000 # smaller tables are sorted quickly enough without index
+AUTO_INDEX_BUDGET = 10 # amount of sort indexes per dataset, the least recently used ones are dropped to make room
+AUTO_INDEX_TRACKED_COLUMNS = 10000 # columns of which sorts are counted, the least recently sorted on are forgotten
+AUTO_INDEX_REFRESH_SECONDS = 60 # the use of a sort index is recorded at most this often, reading a page stays a read
+INDEX_CHECKS_KEPT = 10000 # tables of which it's remembered at which version their search index was last checked
 
 ACTIVE_USER_TIME_SECONDS = 300
 
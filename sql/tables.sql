@@ -79,3 +79,31 @@ CREATE TABLE Backups (
   FOREIGN KEY (id_dataset) REFERENCES Dataset(id) ON DELETE CASCADE,
   PRIMARY KEY (id_dataset, table_name, timestamp)
 );
+
+CREATE TABLE Search_Index (
+  id_dataset VARCHAR(255),
+  id_table   VARCHAR(255),
+
+  FOREIGN KEY (id_dataset) REFERENCES Dataset(id) ON DELETE CASCADE,
+  PRIMARY KEY (id_dataset, id_table)
+);
+
+CREATE TABLE Full_Text_Index (
+  id_dataset VARCHAR(255),
+  id_table   VARCHAR(255),
+  language   VARCHAR(255),
+  columns    TEXT,
+
+  FOREIGN KEY (id_dataset) REFERENCES Dataset(id) ON DELETE CASCADE,
+  PRIMARY KEY (id_dataset, id_table)
+);
+
+CREATE TABLE Auto_Index (
+  id_dataset  VARCHAR(255),
+  id_table    VARCHAR(255),
+  column_name VARCHAR(255),
+  last_used   TIMESTAMP,
+
+  FOREIGN KEY (id_dataset) REFERENCES Dataset(id) ON DELETE CASCADE,
+  PRIMARY KEY (id_dataset, id_table, column_name)
+);